@@ -5,6 +5,18 @@ from datetime import datetime
 from openpyxl import Workbook
 import openpyxl
 from modules import helper_funcs
+from modules import schedule_renderer
+from modules import factor_variants
+from modules import case_pruning
+from modules import extraction_service
+from modules import catalogue_selection
+from modules import run_history
+from modules import slide_path
+from modules import gsa_combinations
+from modules import result_tables
+from modules import result_checks
+from modules import governing_index
+from modules import traffic_influence
 
 # ============================================================================
 # Bearing Information
@@ -13,32 +25,32 @@ from modules import helper_funcs
 
 bearings = {
     "bearing_1": {
-        "name": "p9_e_free",
+        "name": "p9_e_guided",
         "nodes": [32316, 32315],
-        "type": "free",
+        "type": "guided",
         "reactions": 32316,
         "displacements": 32315,
     },
     "bearing_2": {
-        "name": "p9_w_fixed",
+        "name": "p9_w_free",
         "nodes": [31307, 31306],
-        "type": "fixed",
+        "type": "free",
         "reactions": 31307,
         "displacements": 31306,
     },
     "bearing_3": {
-        "name": "p10_e_free",
+        "name": "p10_e_fixed",
         "nodes": [30098, 30097],
-        "type": "free",
-        "reactions": 32316,
-        "displacements": 32315,
+        "type": "fixed",
+        "reactions": 30098,
+        "displacements": 30097,
     },
     "bearing_4": {
-        "name": "p10_w_guided",
+        "name": "p10_w_free",
         "nodes": [17027, 12110],
         "type": "free",
-        "reactions": 32316,
-        "displacements": 32315,
+        "reactions": 17027,
+        "displacements": 12110,
     },
 }
 
@@ -136,8 +148,25 @@ disp_cases_traffic = disp_cases_dict["Traffic"]
 # ============================================================================
 # Import GSA models as objects
 # ============================================================================
-static_model = GSA("models\WBBn_base_v48_base.gwb")
-traffic_model = GSA("models\WBBn_base_v48_traffic (Node effects)_solved.gwb")
+# GSA model files of the static and traffic models
+model_files = extraction_service.GSA_MODELS
+
+# get results from a running extraction service (modules/extraction_service.py)
+# instead of opening the models for every run
+use_extraction_service = False
+if use_extraction_service == True:
+    service = extraction_service.ExtractionClient()
+    static_model = service.model("static")
+    traffic_model = service.model("traffic")
+
+    # all nodes and cases of the run in one request per model and result
+    static_model.prefetch("reactions", reaction_nodes, react_cases_static)
+    traffic_model.prefetch("reactions", reaction_nodes, react_cases_traffic)
+    static_model.prefetch("displacements", displacement_nodes, disp_cases_static)
+    traffic_model.prefetch("displacements", displacement_nodes, disp_cases_traffic)
+else:
+    static_model = GSA(model_files["static"])
+    traffic_model = GSA(model_files["traffic"])
 
 # ============================================================================
 # Get results from GSA
@@ -170,34 +199,27 @@ def get_reactions_gsa(reaction_nodes, react_cases_static, react_cases_traffic):
     ---------
     reactions_by_node, reactions
     """
-    node_reactions = {}
-    for node in reaction_nodes:
-        node_reactions[node] = {}
+    reaction_columns = ["Fx", "Fy", "Fz", "Mx", "My", "Mz"]
+
+    # fill one preallocated array (nodes, cases, reactions) in case table
+    # order, each case at the row of its load type in reaction_cases
+    values, case_position = result_tables.allocate_results(
+        reaction_nodes, reaction_cases, reaction_columns
+    )
+    for i, node in enumerate(reaction_nodes):
         for static_case in react_cases_static:
             reaction = static_model.get_node_reactions(node, static_case)
-            node_reactions[node].update({static_case: reaction})
+            values[i, case_position[static_case]] = reaction
 
         for traffic_case in react_cases_traffic:
             reaction = traffic_model.get_node_reactions(node, traffic_case)
-            node_reactions[node].update({traffic_case: reaction})
-
-    # Convert dictionary of node reactions to dataframes, label columns and
-    reactions_by_node = {}
-    for node in node_reactions.keys():
-        df = pd.DataFrame(data=node_reactions[node]).T
-        df.columns = ["Fx", "Fy", "Fz", "Mx", "My", "Mz"]
-        # add load type for each load case
-        df = pd.merge(
-            reaction_cases, df, how="outer", left_on="case", right_on=df.index
-        )
-        # add node column and move to column index '0'
-        df["node"] = node
+            values[i, case_position[traffic_case]] = reaction
 
-        helper_funcs.move_column_df(df, 0, "node")
-        df.set_index(reaction_cases.index, inplace=True)
-        reactions_by_node[node] = df
-
-    reactions = pd.concat(list(reactions_by_node.values()))
+    # build the final table once, indexed by load type
+    reactions = result_tables.results_table(
+        reaction_nodes, reaction_cases, values, reaction_columns
+    )
+    reactions_by_node = result_tables.split_by_node(reactions, reaction_nodes)
 
     return reactions_by_node, reactions
 
@@ -239,37 +261,33 @@ def get_displacements_gsa(displacement_nodes, disp_cases_static, disp_cases_traf
     ---------
     displacements
     """
-    node_disp = {}
-    for node in displacement_nodes:
-        node_disp[node] = {}
+    disp_columns = ["Dx", "Dy", "Dz", "Rx", "Ry", "Rz"]
+
+    # fill one preallocated array (nodes, cases, displacements) in case table
+    # order, each case at the row of its load type in disp_cases
+    values, case_position = result_tables.allocate_results(
+        displacement_nodes, disp_cases, disp_columns
+    )
+    for i, node in enumerate(displacement_nodes):
         for static_case in disp_cases_static:
             disp = static_model.get_node_displacements(node, static_case)
-
-            node_disp[node].update({static_case: disp})
+            values[i, case_position[static_case]] = disp
 
         for traffic_case in disp_cases_traffic:
             disp = traffic_model.get_node_displacements(node, traffic_case)
-            node_disp[node].update({traffic_case: disp})
-
-    # Convert dictionary of node reactions to dataframes, one for each node
-    displacements_by_node = {}
-    for node in node_disp.keys():
-        df = pd.DataFrame(data=node_disp[node]).T
-        df.columns = ["Dx", "Dy", "Dz", "Rx", "Ry", "Rz"]
-        # scale by 1000
-        disp_scale = 1000
-        df[df.columns] *= disp_scale
-        # add load type for each load case
-        df = pd.merge(disp_cases, df, how="outer", left_on="case", right_on=df.index)
-
-        # add node column and move to column index '0'
-        df["node"] = node
-        helper_funcs.move_column_df(df, 0, "node")
+            values[i, case_position[traffic_case]] = disp
 
-        df.set_index(disp_cases.index, inplace=True)
-        displacements_by_node[node] = df
+    # scale by 1000
+    disp_scale = 1000
+    values *= disp_scale
 
-    displacements = pd.concat(list(displacements_by_node.values()))
+    # build the final table once, indexed by load type
+    displacements = result_tables.results_table(
+        displacement_nodes, disp_cases, values, disp_columns
+    )
+    displacements_by_node = result_tables.split_by_node(
+        displacements, displacement_nodes
+    )
 
     return displacements_by_node, displacements
 
@@ -284,12 +302,231 @@ displacements_by_type = (
 
 displacements_by_type.drop(columns=["case"], inplace=True)
 
+# check the combination cases extracted from the static model against GSA's
+# combination definitions evaluated over the analysis cases they use, for the
+# same nodes and the same model
+check_gsa_combinations = True
+if check_gsa_combinations == True:
+    gsa_combination_definitions = gsa_combinations.read_combination_definitions(
+        "data/static_combinations.csv"
+    )["Description"]
+    gsa_combination_differences = {}
+    for result, table, nodes, get_results, scale in [
+        ("reactions", reactions, reaction_nodes, static_model.get_node_reactions, 1),
+        (
+            "displacements",
+            displacements,
+            displacement_nodes,
+            static_model.get_node_displacements,
+            1000,
+        ),
+    ]:
+        dofs = [column for column in table.columns if column not in ["node", "case"]]
+        extracted = table.loc[table["case"].isin(gsa_combination_definitions.index)]
+        matrix = gsa_combinations.compile_combinations(
+            gsa_combination_definitions, extracted["case"].unique()
+        )
+        if use_extraction_service == True:
+            static_model.prefetch(result, nodes, matrix["cases"])
+        analysis_results = pd.DataFrame(
+            [
+                get_results(node, case)
+                for node in nodes
+                for case in matrix["cases"]
+            ],
+            index=pd.MultiIndex.from_product([nodes, matrix["cases"]], names=["node", "case"]),
+            columns=dofs,
+        ) * scale
+        gsa_combination_differences[result] = gsa_combinations.cross_check(
+            gsa_combinations.evaluate_combinations(matrix, analysis_results),
+            extracted.set_index(["node", "case"])[dofs],
+            gsa_combinations.rounding_tolerance(matrix, analysis_results),
+        )
+
+# check the extracted results on every run. The four bearings are the only
+# supports, so their reactions balance the applied load of each case. Gravity
+# loads have no horizontal component and temperature loads are self-equilibrated.
+applied_loads_by_type = {
+    "G_Perm": {"Fx": 0.0, "Fy": 0.0},
+    "T_Temp": {"Fx": 0.0, "Fy": 0.0, "Fz": 0.0},
+}
+applied_loads = result_checks.applied_loads(reaction_cases, applied_loads_by_type)
+
+# the model exports have no applied load totals, so the vertical reactions of
+# the permanent cases are compared with a snapshot of the checked 2021 run
+# (data/static_reactions.csv). Update the snapshot when the permanent loads of
+# the model change on purpose.
+reference_reaction_totals = {
+    "C11": {"Fz": 103200.0},
+    "C12": {"Fz": 94800.0},
+}
+
+result_violations = pd.concat(
+    [
+        result_checks.equilibrium_check(reactions, applied_loads),
+        result_checks.reaction_total_check(reactions, reference_reaction_totals),
+        result_checks.node_pair_check(
+            bearings, reaction_nodes, displacement_nodes, reactions, displacements
+        ),
+    ],
+    ignore_index=True,
+)
+result_checks.report_violations(
+    result_violations,
+    {
+        "equilibrium": int(applied_loads.notna().sum().sum()),
+        "reaction_total": sum(len(totals) for totals in reference_reaction_totals.values()),
+        "node_pair": len(bearings),
+    },
+)
+
+# the schedule and the catalogue selection take the results of each bearing
+# from its node pair, so stop here if a pair is wrong
+node_pair_violations = result_violations.loc[result_violations["check"] == "node_pair"]
+if len(node_pair_violations):
+    raise ValueError(
+        f"Bearing node pairs do not match the extracted results:\n{node_pair_violations}"
+    )
+
+# cases of the temperature and wind families that can govern, per bearing,
+# for case-by-case combination. The combinations below use the max and min of
+# each load type, which pruning does not change, so this is off by default.
+# envelopes of the pruned results are checked against the full results.
+prune_case_families = False
+if prune_case_families == True:
+    case_families = ["T_Temp", "W_wind_no_traffic", "W_wind_traffic"]
+
+    reactions_pruned, reaction_pruning_report = case_pruning.prune_cases(
+        reactions, case_families, ["Fx", "Fy", "Fz", "Mx", "My", "Mz"]
+    )
+    displacements_pruned, displacement_pruning_report = case_pruning.prune_cases(
+        displacements, case_families, ["Dx", "Dy", "Dz", "Rx", "Ry", "Rz"]
+    )
+
+# cumulative slide path and movement ranges under traffic from a movement
+# time series, e.g. the displacements of each step of an influence line run,
+# see slide_path.read_time_series for the file format. The traffic cases of
+# the model are NIE(Max)/NIE(Min) envelope cases, not a history, so there is
+# nothing to accumulate without a time series.
+traffic_time_series = None
+if traffic_time_series is not None:
+    slide_dofs = ["Dx", "Dy", "Rx", "Ry", "Rz"]
+    traffic_slide_path, traffic_movement_ranges = slide_path.accumulate_slide_path(
+        slide_path.read_time_series(traffic_time_series, displacement_nodes, slide_dofs),
+        displacement_nodes,
+        slide_dofs,
+    )
+
+# LM1 envelopes of the bearing reactions from unit-load influence surfaces,
+# for trying lane layouts without solving the traffic model again, see
+# traffic_influence.read_influence_surfaces for the file format. The number
+# of notional lanes follows EN 1991-2 Table 4.1 for the width of the surfaces.
+compute_traffic_influence = False
+if compute_traffic_influence == True:
+    influence_surfaces = traffic_influence.read_influence_surfaces(
+        "data/traffic_influence_surfaces.csv"
+    )
+    carriageway = (influence_surfaces["y"][0], influence_surfaces["y"][-1])
+    n_lanes = int((carriageway[1] - carriageway[0]) // traffic_influence.LANE_WIDTH)
+    traffic_influence_envelope, traffic_governing_layout = (
+        traffic_influence.governing_envelope(
+            traffic_influence.traffic_envelopes(
+                influence_surfaces,
+                traffic_influence.lane_layouts(carriageway, n_lanes),
+                carriageway,
+            )
+        )
+    )
+
+    # traffic envelope of the solved traffic model next to it, for checking
+    traffic_dofs = [dof for dof in influence_surfaces["dofs"] if dof in reactions.columns]
+    model_traffic = reactions.loc[["Traffic"]].groupby("node")[traffic_dofs]
+    traffic_envelope_comparison = pd.concat(
+        {
+            "influence": traffic_influence_envelope[traffic_dofs],
+            "model": pd.concat(
+                {"max": model_traffic.max(), "min": model_traffic.min()}, names=["bound"]
+            ).swaplevel().sort_index(),
+        },
+        axis=1,
+    )
+    print("\nLM1 envelopes from influence surfaces and the traffic model:")
+    print(traffic_envelope_comparison)
+
 # ============================================================================
 # Calculate combinations for reactions and displacements
 # ============================================================================
 
 
-def combine_reactions(reaction_factors, reactions_by_node):
+# load type of each load of the combinations
+load_types = {"G": "G_Perm", "LM1": "Traffic", "W": "W_wind_no_traffic", "T": "T_Temp"}
+
+# how each reaction load effect is derived from the case results of its load
+# type, (bound, load): (max or min of the cases, sign of each dof). The
+# governing index credits contributing cases from the same table.
+reaction_effect_derivations = {
+    ("max", "G"): ("max", 1),
+    ("max", "LM1"): ("max", 1),
+    ("max", "W"): ("max", 1),
+    ("max", "T"): ("max", 1),
+    ("min", "G"): ("max", 1),
+    ("min", "LM1"): ("min", -1),
+    ("min", "W"): ("max", {"Fx": -1, "Fy": -1, "Fz": 1, "Mx": -1, "My": -1, "Mz": -1}),
+    ("min", "T"): ("max", -1),
+}
+
+
+def reaction_load_effects(reactions_by_node):
+    """
+    Obtain max and min reactions by load type for each node. These are the
+    load type effects that the reaction combinations factor and add together.
+
+    parameters:
+    ------------
+    reactions_by_node: dict
+        Dictionary of Dataframes with reactions for each node
+
+    Returns:
+    ---------
+    load_effects: DataFrame
+        reactions indexed by (node, bound, load) with bound = 'max' or 'min'
+        and load = 'G', 'LM1', 'W' or 'T'
+    """
+    reaction_columns = ["Fx", "Fy", "Fz", "Mx", "My", "Mz"]
+    load_effects = governing_index.derive_load_effects(
+        reactions_by_node,
+        reaction_nodes,
+        reaction_columns,
+        load_types,
+        reaction_effect_derivations,
+    )
+
+    # add minimum horizontal traffic load components for breaking,etc.
+    for node in bearings_by_type["fixed"]:
+        load_effects.loc[(node, "max", "LM1"), ["Fx", "Fy"]] = [800, 200]
+    for node in bearings_by_type["guided"]:
+        load_effects.loc[(node, "max", "LM1"), ["Fy"]] = [200]
+
+    return load_effects
+
+
+reaction_effects = reaction_load_effects(reactions_by_node)
+
+# combinations that use the maximum load type effects, all other combinations
+# use the minimum effects
+reaction_max_combs = [
+    "uls_1",
+    "uls_2",
+    "uls_3",
+    "uls_4",
+    "slS_1",
+    "sls_2",
+    "sls_3",
+    "sls_4",
+]
+
+
+def combine_reactions(reaction_factors, load_effects):
     """
     Combine reactions using combinations dictionary
 
@@ -297,8 +534,9 @@ def combine_reactions(reaction_factors, reactions_by_node):
     ------------
     combinations: dict
         Dictionary with combination factors to use
-    reactions_by_node: dict
-        Dictionary of Dataframes with reactions for each node
+    load_effects: DataFrame
+        max and min reactions by load type for each node, see
+        reaction_load_effects
 
     Returns:
     ---------
@@ -308,92 +546,25 @@ def combine_reactions(reaction_factors, reactions_by_node):
         Dataframes with combined reactions for all nodes
 
     """
-    # obtain max and min reactions by load type for each node
-    reaction_combinations_by_node = {}
-    for node in reaction_nodes:
-        reaction_columns = ["Fx", "Fy", "Fz", "Mx", "My", "Mz"]
-
-        # Obtain maximum values for each load type
-        max_G = reactions_by_node[node].loc["G_Perm", reaction_columns].max()
-        max_LM1 = reactions_by_node[node].loc["Traffic", reaction_columns].max()
-
-        # add minimum horizontal traffic load components for breaking,etc.
-        if node in bearings_by_type["fixed"]:
-            max_LM1[["Fx", "Fy"]] = [800, 200]
-        elif node in bearings_by_type["guided"]:
-            max_LM1[["Fy"]] = [200]
-
-        max_W = reactions_by_node[node].loc["W_wind_no_traffic", reaction_columns].max()
-        max_T = reactions_by_node[node].loc["T_Temp", reaction_columns].max()
-
-        # Obtain minimum values for each load type
-        min_G = reactions_by_node[node].loc["G_Perm", reaction_columns].max()
-        min_LM1 = -reactions_by_node[node].loc["Traffic", reaction_columns].min()
-        # add minimum horizontal traffic load components for breaking,etc.
-        # min_LM1[['Fx', 'Fy']] = [-800, -200]
-
-        min_W = (
-            -reactions_by_node[node].loc["W_wind_no_traffic", reaction_columns].max()
-        )
-        min_W["Fz"] = -min_W["Fz"]
-        min_T = -reactions_by_node[node].loc["T_Temp", reaction_columns].max()
-
-        reaction_combinations = {}
-        for comb in reaction_factors.keys():
-            max_combs = [
-                "uls_1",
-                "uls_2",
-                "uls_3",
-                "uls_4",
-                "slS_1",
-                "sls_2",
-                "sls_3",
-                "sls_4",
-            ]
-            if comb in max_combs:
-                factored_reaction = (
-                    max_G.multiply(other=reaction_factors[comb]["G"])
-                    + max_LM1.multiply(other=reaction_factors[comb]["LM1"])
-                    + max_W.multiply(other=reaction_factors[comb]["W"])
-                    + max_T.multiply(other=reaction_factors[comb]["T"])
-                )
-            else:
-                factored_reaction = (
-                    min_G.multiply(other=reaction_factors[comb]["G"])
-                    + min_LM1.multiply(other=reaction_factors[comb]["LM1"])
-                    + min_W.multiply(other=reaction_factors[comb]["W"])
-                    + min_T.multiply(other=reaction_factors[comb]["T"])
-                )
-            factored_reaction["name"] = reaction_factors[comb]["name"]
-            factored_reaction["limit_state"] = reaction_factors[comb]["type"]
-            reaction_combinations[comb] = factored_reaction
-        # convert combined reactions to df
-        df = pd.DataFrame(reaction_combinations).T
-
-        df.reset_index(level=0, inplace=True)
-        df = df.rename(columns={"index": "combination"})
-
-        # add node column and move to column index '0'
-        df["node"] = node
-        helper_funcs.move_column_df(df, 0, "node")
-        helper_funcs.move_column_df(df, 1, "limit_state")
-        helper_funcs.move_column_df(df, 2, "combination")
-        helper_funcs.move_column_df(df, 3, "name")
-
-        # create dictionary of combined reaction DataFrames per node
-        reaction_combinations_by_node[node] = df
-
-    # combine all node dataframes into one for export to excel
-    reaction_combinations_df = pd.concat(list(reaction_combinations_by_node.values()))
-    reaction_combinations_df.set_index("node", inplace=True)
-    # Arrange table by node and limit state
+    factor_sets = factor_variants.stack_factor_sets(
+        {"design": reaction_factors}, reaction_max_combs
+    )
+    combinations, _ = factor_variants.evaluate_factor_sets(load_effects, factor_sets)
+
+    # table for export to excel, indexed by node
+    reaction_combinations_df = result_tables.combinations_table(combinations)
+    reaction_combinations_by_node = {
+        node: df.reset_index()
+        for node, df in reaction_combinations_df.groupby(level="node", sort=False)
+    }
 
+    # Arrange table by node and limit state
+    reaction_columns = list(load_effects.columns)
     reaction_envelopes_df = (
-        reaction_combinations_df.groupby(by=["node", "limit_state"])
+        reaction_combinations_df.groupby(by=["node", "limit_state"])[reaction_columns]
         .agg(["max", "min"])
         .stack()
     )
-    reaction_envelopes_df.drop(columns=["combination", "name"], inplace=True)
     return (
         reaction_combinations_by_node,
         reaction_combinations_df,
@@ -405,10 +576,94 @@ def combine_reactions(reaction_factors, reactions_by_node):
     reaction_combinations_by_node,
     reaction_combinations,
     reaction_envelopes,
-) = combine_reactions(reaction_factors, reactions_by_node)
+) = combine_reactions(reaction_factors, reaction_effects)
+
+# what-if studies: evaluate alternative factor sets against the cached
+# reaction load effects in one pass, variant id as first index level
+run_factor_variants = False
+if run_factor_variants == True:
+    reaction_factor_sets = factor_variants.stack_factor_sets(
+        {
+            "base": reaction_factors,
+            **factor_variants.sweep_factor(reaction_factors, "LM1", [0.9, 1.1]),
+            **factor_variants.sweep_factor(reaction_factors, "T", [0.9, 1.1]),
+        },
+        max_combs=reaction_max_combs,
+    )
+    (
+        reaction_variant_combinations,
+        reaction_variant_envelopes,
+    ) = factor_variants.evaluate_factor_sets(reaction_effects, reaction_factor_sets)
+
+    # the base variant must reproduce the design combinations exactly
+    base_combinations = (
+        reaction_variant_combinations.loc["base"]
+        .reset_index()
+        .set_index("node")[reaction_combinations.columns]
+    )
+    if not base_combinations.equals(reaction_combinations):
+        raise ValueError(
+            "Base factor variant does not reproduce the design reaction combinations"
+        )
 
 
-def combine_displacements(disp_factors, displacements_by_node):
+# how each displacement load effect is derived from the case results of its
+# load type, see reaction_effect_derivations. Permanent displacements are not
+# part of the displacement combinations, so G has no derivation and no effect.
+displacement_effect_derivations = {
+    ("max", "G"): None,
+    ("max", "LM1"): ("max", 1),
+    ("max", "W"): ("max", 1),
+    ("max", "T"): ("max", 1),
+    ("min", "G"): None,
+    ("min", "LM1"): ("min", 1),
+    ("min", "W"): ("max", {"Dx": -1, "Dy": -1, "Dz": 1, "Rx": -1, "Ry": -1, "Rz": -1}),
+    ("min", "T"): ("max", -1),
+}
+
+
+def displacement_load_effects(displacements_by_node):
+    """
+    Obtain max and min displacements by load type for each node. Permanent
+    displacements are not part of the displacement combinations, so the
+    effect of G is zero.
+
+    parameters:
+    ------------
+    displacements_by_node: dict
+        Dictionary of Dataframes with displacements for each node
+
+    Returns:
+    ---------
+    load_effects: DataFrame
+        displacements indexed by (node, bound, load) with bound = 'max' or
+        'min' and load = 'G', 'LM1', 'W' or 'T'
+    """
+    disp_cols = ["Dx", "Dy", "Dz", "Rx", "Ry", "Rz"]
+    return governing_index.derive_load_effects(
+        displacements_by_node,
+        displacement_nodes,
+        disp_cols,
+        load_types,
+        displacement_effect_derivations,
+    )
+
+
+displacement_effects = displacement_load_effects(displacements_by_node)
+
+displacement_max_combs = [
+    "uls_1",
+    "uls_2",
+    "uls_3",
+    "uls_4",
+    "sls_1",
+    "sls_2",
+    "sls_3",
+    "sls_4",
+]
+
+
+def combine_displacements(disp_factors, load_effects):
     """
     Combine displacements using combinations dictionary
 
@@ -416,8 +671,9 @@ def combine_displacements(disp_factors, displacements_by_node):
     ------------
     combinations: dict
         Dictionary with combination factors to use
-    displacements_by_node: dict
-        Dictionary of Dataframes with displacements for each node
+    load_effects: DataFrame
+        max and min displacements by load type for each node, see
+        displacement_load_effects
 
     Returns:
     ---------
@@ -427,82 +683,34 @@ def combine_displacements(disp_factors, displacements_by_node):
         Dataframes with combined displacements for all nodes
 
     """
-    # obtain max and min displacements by load type for each node
-    displacement_combinations_by_node = {}
-    for node in displacement_nodes:
-        disp_cols = ["Dx", "Dy", "Dz", "Rx", "Ry", "Rz"]
-
-        # Obtain maximum values for each load type
-        max_G = displacements_by_node[node].loc["G_Perm", disp_cols].max()
-        max_G_rev = displacements_by_node[node].loc["G_Reverse", disp_cols].sum()
-        max_LM1 = displacements_by_node[node].loc["Traffic", disp_cols].max()
-        max_W = displacements_by_node[node].loc["W_wind_no_traffic", disp_cols].max()
-        max_T = displacements_by_node[node].loc["T_Temp", disp_cols].max()
-
-        # Obtain minimum values for each load type
-        min_G = displacements_by_node[node].loc["G_Perm", disp_cols].max()
-        min_G_rev = displacements_by_node[node].loc["G_Reverse", disp_cols].sum()
-        min_LM1 = displacements_by_node[node].loc["Traffic", disp_cols].min()
-        min_W = -displacements_by_node[node].loc["W_wind_no_traffic", disp_cols].max()
-        min_W["Dz"] = -min_W["Dz"]
-        min_T = -displacements_by_node[node].loc["T_Temp", disp_cols].max()
-
-        displacement_combinations = {}
-        for comb in disp_factors.keys():
-            max_combs = [
-                "uls_1",
-                "uls_2",
-                "uls_3",
-                "uls_4",
-                "sls_1",
-                "sls_2",
-                "sls_3",
-                "sls_4",
-            ]
-            if comb in max_combs:
-                factored_displacement = 1 * (
-                    +max_LM1.multiply(other=disp_factors[comb]["LM1"])
-                    + max_W.multiply(other=disp_factors[comb]["W"])
-                    + max_T.multiply(other=disp_factors[comb]["T"])
-                )
-            else:
-                factored_displacement = 1 * (
-                    +min_LM1.multiply(other=disp_factors[comb]["LM1"])
-                    + min_W.multiply(other=disp_factors[comb]["W"])
-                    + min_T.multiply(other=disp_factors[comb]["T"])
-                )
-            factored_displacement["name"] = reaction_factors[comb]["name"]
-            factored_displacement["limit_state"] = reaction_factors[comb]["type"]
-            displacement_combinations[comb] = factored_displacement
-        # convert combined displacements to df
-        df = pd.DataFrame(displacement_combinations).T
-
-        df.reset_index(level=0, inplace=True)
-        df = df.rename(columns={"index": "combination"})
-
-        # add node column and move to column index '0'
-        df["node"] = node
-        helper_funcs.move_column_df(df, 0, "node")
-        helper_funcs.move_column_df(df, 1, "limit_state")
-        helper_funcs.move_column_df(df, 2, "combination")
-        helper_funcs.move_column_df(df, 3, "name")
-
-        # create dictionary of combined displacement DataFrames per node
-        displacement_combinations_by_node[node] = df
-
-    # combine all node dataframes into one for export to excel
-    displacement_combinations_df = pd.concat(
-        list(displacement_combinations_by_node.values())
+    # displacement combinations are labelled with the reaction combination names
+    factors = {
+        comb: {
+            **disp_factors[comb],
+            "name": reaction_factors[comb]["name"],
+            "type": reaction_factors[comb]["type"],
+        }
+        for comb in disp_factors.keys()
+    }
+    factor_sets = factor_variants.stack_factor_sets(
+        {"design": factors}, displacement_max_combs
     )
-    displacement_combinations_df.set_index("node", inplace=True)
+    combinations, _ = factor_variants.evaluate_factor_sets(load_effects, factor_sets)
+
+    # table for export to excel, indexed by node
+    displacement_combinations_df = result_tables.combinations_table(combinations)
+    displacement_combinations_by_node = {
+        node: df.reset_index()
+        for node, df in displacement_combinations_df.groupby(level="node", sort=False)
+    }
 
     # Arrange table by node and limit state for export to excel
+    disp_cols = list(load_effects.columns)
     displacement_envelopes_df = (
-        displacement_combinations_df.groupby(by=["node", "limit_state"])
+        displacement_combinations_df.groupby(by=["node", "limit_state"])[disp_cols]
         .agg(["max", "min"])
         .stack()
     )
-    displacement_envelopes_df.drop(columns=["combination", "name"], inplace=True)
 
     return (
         displacement_combinations_by_node,
@@ -515,7 +723,25 @@ def combine_displacements(disp_factors, displacements_by_node):
     displacement_combinations_by_node,
     displacement_combinations,
     displacement_envelopes,
-) = combine_displacements(disp_factors, displacements_by_node)
+) = combine_displacements(disp_factors, displacement_effects)
+
+# select the smallest adequate product of the supplier catalogue for every
+# bearing, see modules/catalogue_selection.py for the catalogue columns
+select_from_catalogue = False
+if select_from_catalogue == True:
+    bearing_catalogue = catalogue_selection.load_catalogue(
+        "bearing_schedule_builder/bearing_catalogue.csv"
+    )
+    bearing_requirements = catalogue_selection.bearing_requirements(
+        bearings,
+        reaction_envelopes,
+        displacement_envelopes,
+        limit_state="ULS",
+        bearings_by_type=bearings_by_type,
+    )
+    bearing_selection = catalogue_selection.select_bearings(
+        bearing_catalogue, bearing_requirements
+    )
 
 # ============================================================================
 # Save GSA Results as excel
@@ -535,13 +761,97 @@ bearing_displacements = {
     "combinations": displacement_combinations,
     "envelopes": displacement_envelopes,
 }
+if traffic_time_series is not None:
+    bearing_displacements["slide_path"] = traffic_slide_path
+    bearing_displacements["movement_ranges"] = traffic_movement_ranges
 
 
-save_to_excel = True
+# the run history below replaces the timestamped workbooks, set True to
+# also write them
+save_to_excel = False
 if save_to_excel == True:
     helper_funcs.write_to_excel(bearing_reactions, "output/bearing_reactions")
     helper_funcs.write_to_excel(bearing_displacements, "output/bearing_displacements")
 
+# store the run in the indexed run history, query it with
+# run_history.query_history instead of opening old workbooks
+save_to_history = True
+if save_to_history == True:
+    history = run_history.open_store("output/run_history.sqlite")
+    run_history.store_run(
+        history,
+        {"reactions": bearing_reactions, "displacements": bearing_displacements},
+        model_files=list(model_files.values()),
+    )
+    history.close()
+
+# ============================================================================
+# Governing result index
+# ============================================================================
+# governing value, combination and contributing cases of each bearing, limit
+# state, dof and sign. Query it with governing_index.GoverningIndex.load or
+# serve it with: python -m modules.governing_index output/governing_index.json
+
+build_governing_index = True
+if build_governing_index == True:
+    reaction_contributions = governing_index.contributing_cases(
+        reactions, reaction_effects, load_types, reaction_effect_derivations
+    )
+    displacement_contributions = governing_index.contributing_cases(
+        displacements, displacement_effects, load_types, displacement_effect_derivations
+    )
+    governing = {
+        "reactions": governing_index.governing_results(
+            reaction_combinations,
+            reaction_factors,
+            reaction_max_combs,
+            reaction_effects,
+            *reaction_contributions,
+        ),
+        "displacements": governing_index.governing_results(
+            displacement_combinations,
+            disp_factors,
+            displacement_max_combs,
+            displacement_effects,
+            *displacement_contributions,
+        ),
+    }
+    bearing_index = governing_index.build_index(bearings, governing)
+    bearing_index.save("output/governing_index.json")
+
+# ============================================================================
+# Render bearing schedule from envelopes
+# ============================================================================
+# schedule column of each bearing in the bearing schedule template
+schedule_columns = {
+    "p10_e_fixed": "G",
+    "p10_w_free": "H",
+    "p9_e_guided": "I",
+    "p9_w_free": "J",
+}
+
+# one schedule file, overwritten by every run, the run history keeps the
+# record of earlier runs
+render_schedule = True
+if render_schedule == True:
+    cell_map = schedule_renderer.load_cell_map(
+        "bearing_schedule_builder/schedule_cell_map.csv"
+    )
+    schedule_renderer.render_schedule(
+        template="output/bearing_specification_v3.xlsx",
+        filename="output/bearing_schedule.xlsx",
+        cell_map=cell_map,
+        envelopes={
+            "reactions": reaction_envelopes,
+            "displacements": displacement_envelopes,
+            "reactions_by_type": reactions_by_type,
+            "displacements_by_type": displacements_by_type,
+        },
+        bearings=bearings,
+        bearing_columns=schedule_columns,
+        sheet_name="Oplegtabel",
+    )
+
 
 if __name__ == "__main__":
     print("\nOutputs successfully copied to bearing schedule")
@@ -2,32 +2,32 @@ class Bearings:
     def __init__(self) -> None:
         self.bearings = {
             "bearing_1": {
-                "name": "p9_e_free",
+                "name": "p9_e_guided",
                 "nodes": [32316, 32315],
-                "type": "free",
+                "type": "guided",
                 "reactions": 32316,
                 "displacements": 32315,
             },
             "bearing_2": {
-                "name": "p9_w_fixed",
+                "name": "p9_w_free",
                 "nodes": [31307, 31306],
-                "type": "fixed",
+                "type": "free",
                 "reactions": 31307,
                 "displacements": 31306,
             },
             "bearing_3": {
-                "name": "p10_e_free",
+                "name": "p10_e_fixed",
                 "nodes": [30098, 30097],
-                "type": "free",
-                "reactions": 32316,
-                "displacements": 32315,
+                "type": "fixed",
+                "reactions": 30098,
+                "displacements": 30097,
             },
             "bearing_4": {
-                "name": "p10_w_guided",
+                "name": "p10_w_free",
                 "nodes": [17027, 12110],
                 "type": "free",
-                "reactions": 32316,
-                "displacements": 32315,
+                "reactions": 17027,
+                "displacements": 12110,
             },
         }
 
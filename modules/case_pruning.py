@@ -0,0 +1,174 @@
+import itertools
+import pandas as pd
+import numpy as np
+
+
+"""
+Prune dominated cases from case families (e.g. T_Temp, wind) before
+case-by-case combination.
+
+For each node and family only the cases that can govern are kept:
+
+- 'pareto': cases on the Pareto front of the dof result vectors in every
+  sign orthant, i.e. of s * values for each of the 2^dofs sign vectors s.
+  Keeps every case that can govern any combination of the dofs with any
+  signs, e.g. Fx - Fz, which includes every single dof envelope.
+- 'extremes': only the cases that give the max or min of one of the dofs.
+  The smallest set that keeps the single dof envelopes unchanged.
+"""
+
+
+METHODS = ["pareto", "extremes"]
+
+
+def _dominated(values):
+    '''
+    Mark vectors that are dominated by another vector of the same node
+
+    values: array of shape (nodes, cases, dofs)
+    returns: bool array of shape (nodes, cases)
+    '''
+    this = values[:, :, None, :]
+    other = values[:, None, :, :]
+    dominates = (other >= this).all(axis=-1) & (other > this).any(axis=-1)
+    return dominates.any(axis=-1)
+
+
+def _orthant_fronts(values):
+    '''
+    Mark vectors on the Pareto front of at least one sign orthant
+
+    values: array of shape (nodes, cases, dofs)
+    returns: bool array of shape (nodes, cases)
+    '''
+    keep = np.zeros(values.shape[:2], dtype=bool)
+    for signs in itertools.product([1.0, -1.0], repeat=values.shape[-1]):
+        keep |= ~_dominated(values * np.asarray(signs))
+    return keep
+
+
+def _extremes(values):
+    '''
+    Mark vectors that give the max or min of one of the dofs
+
+    values: array of shape (nodes, cases, dofs)
+    returns: bool array of shape (nodes, cases)
+    '''
+    keep = np.zeros(values.shape[:2], dtype=bool)
+    nodes = np.arange(values.shape[0])[:, None]
+    keep[nodes, values.argmax(axis=1)] = True
+    keep[nodes, values.argmin(axis=1)] = True
+    return keep
+
+
+def pruning_index(results, families, dofs, method="pareto"):
+    '''
+    Precompute which cases of each family can govern, per node
+
+    Parameters:
+    ------------
+    results: DataFrame
+        results indexed by load type with columns = ['node', 'case'] + dofs,
+        as returned by get_reactions_gsa/get_displacements_gsa
+    families: list
+        load types to prune, e.g. ['T_Temp', 'W_wind_no_traffic']
+    dofs: list
+        result columns, e.g. ['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz']
+    method: str
+        'pareto' or 'extremes'
+
+    Returns:
+    ---------
+    keep: ndarray
+        bool array aligned with the rows of results, False for pruned cases.
+        Load types not in families are always kept.
+    '''
+    if method not in METHODS:
+        raise ValueError(f"Unknown pruning method '{method}', use one of {METHODS}")
+
+    load_types = results.index.to_numpy()
+    nodes = results["node"].to_numpy()
+    values = results[dofs].to_numpy(dtype=float)
+
+    keep = np.ones(len(results), dtype=bool)
+    for family in families:
+        # rows of the family grouped by node, every node has the same cases
+        rows = np.flatnonzero(load_types == family)
+        rows = rows[np.argsort(nodes[rows], kind="stable")]
+        n_nodes = len(np.unique(nodes[rows]))
+        family_values = values[rows].reshape(n_nodes, -1, len(dofs))
+
+        if method == "pareto":
+            family_keep = _orthant_fronts(family_values)
+        else:
+            family_keep = _extremes(family_values)
+
+        keep[rows] = family_keep.ravel()
+
+    return keep
+
+
+def prune_cases(results, families, dofs, method="pareto"):
+    '''
+    Remove dominated cases from results and check the envelope is unchanged
+
+    Parameters:
+    ------------
+    results: DataFrame
+        results indexed by load type with columns = ['node', 'case'] + dofs
+    families: list
+        load types to prune
+    dofs: list
+        result columns
+    method: str
+        'pareto' or 'extremes'
+
+    Returns:
+    ---------
+    pruned: DataFrame
+        results without the dominated cases
+    report: DataFrame
+        number of cases, kept and eliminated per node and load type
+    '''
+    keep = pruning_index(results, families, dofs, method)
+    pruned = results.loc[keep]
+
+    # max and min of each dof per node and load type must not change. With
+    # 'pareto' the max of every signed sum of the dofs must not change either.
+    signs = np.eye(len(dofs))
+    if method == "pareto":
+        signs = np.array(list(itertools.product([1.0, -1.0], repeat=len(dofs))))
+
+    def envelope(df):
+        values = df[dofs].to_numpy(dtype=float)
+        sums = pd.DataFrame(
+            values @ signs.T, index=pd.MultiIndex.from_arrays([df["node"], df.index])
+        )
+        return sums.groupby(level=[0, 1]).agg(["max", "min"]).sort_index()
+
+    if not np.array_equal(
+        envelope(results).to_numpy(), envelope(pruned).to_numpy(), equal_nan=True
+    ):
+        raise ValueError("Pruning dominated cases changed the envelope")
+
+    family_rows = results.index.isin(families)
+    report = (
+        pd.DataFrame(
+            {
+                "node": results["node"].to_numpy()[family_rows],
+                "type": results.index.to_numpy()[family_rows],
+                "cases": 1,
+                "kept": keep[family_rows].astype(int),
+            }
+        )
+        .groupby(by=["node", "type"])
+        .sum()
+    )
+    report["eliminated"] = report["cases"] - report["kept"]
+
+    print(
+        f'\nPruned {report["eliminated"].sum()} of {report["cases"].sum()} '
+        f'{"/".join(families)} cases ({method})'
+    )
+
+    return pruned, report
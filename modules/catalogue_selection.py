@@ -0,0 +1,230 @@
+import pandas as pd
+import numpy as np
+
+
+"""
+Select bearing products from a supplier catalogue using the envelopes.
+
+The catalogue is a .csv file with one row per product:
+
+    product, type, N_max, N_min, Vx, Vy, ux, uy, rotation
+
+- type: 'free', 'guided' or 'fixed'
+- N_max: vertical capacity [kN]
+- N_min: minimum vertical load the product needs [kN], negative if it
+  can take uplift
+- Vx, Vy: horizontal capacity in x and y [kN]
+- ux, uy: movement capacity in x and y, plus and minus [mm]
+- rotation: rotation capacity [mrad]
+
+The products of each type are sorted by N_max, so the smallest adequate
+product is the first product from the N_max search position that passes
+all other checks of its type.
+"""
+
+
+CAPACITIES = ["N_max", "N_min", "Vx", "Vy", "ux", "uy", "rotation"]
+
+# checks besides N_max, N_min and rotation for each bearing type
+TYPE_CHECKS = {
+    "free": ["ux", "uy"],
+    "guided": ["Vy", "ux"],
+    "fixed": ["Vx", "Vy"],
+}
+
+
+def _check_types(types, source):
+    unknown = set(types) - set(TYPE_CHECKS)
+    if unknown:
+        raise ValueError(
+            f"Unknown bearing type(s) {sorted(unknown)} in {source}, "
+            f"use one of {list(TYPE_CHECKS)}"
+        )
+
+
+def load_catalogue(filename):
+    '''
+    Load bearing catalogue into arrays sorted by vertical capacity
+
+    Parameters:
+    ------------
+    filename: str
+        path to catalogue .csv file
+
+    Returns:
+    ---------
+    catalogue: dict
+        for each bearing type a dictionary of arrays sorted by N_max, with
+        keys = ['product'] + CAPACITIES
+    '''
+    df = pd.read_csv(filename)
+    df["type"] = df["type"].str.lower()
+    _check_types(df["type"], "catalogue")
+
+    catalogue = {}
+    for bearing_type, products in df.groupby("type"):
+        products = products.sort_values(by="N_max", kind="stable")
+        catalogue[bearing_type] = {
+            "product": products["product"].to_numpy(),
+            **{
+                capacity: products[capacity].to_numpy(dtype=float)
+                for capacity in CAPACITIES
+            },
+        }
+
+    return catalogue
+
+
+def bearing_requirements(
+    bearings,
+    reaction_envelopes,
+    displacement_envelopes,
+    limit_state="ULS",
+    bearings_by_type=None,
+):
+    '''
+    Requirements of each bearing from the reaction and displacement envelopes
+
+    Parameters:
+    ------------
+    bearings: dict
+        bearing information with 'name', 'type' and 'nodes' = [reaction node,
+        displacement node] for each bearing
+    reaction_envelopes: DataFrame
+        reaction envelopes indexed by (node, limit_state, max/min)
+    displacement_envelopes: DataFrame
+        displacement envelopes indexed by (node, limit_state, max/min)
+    limit_state: str
+        limit state used for the selection
+    bearings_by_type: dict
+        optional reaction nodes of each bearing type, e.g. {'fixed': [30098]},
+        checked against the type of each bearing
+
+    Returns:
+    ---------
+    requirements: DataFrame
+        indexed by bearing name with columns = ['type'] + CAPACITIES
+    '''
+    bearing_table = pd.DataFrame(list(bearings.values())).set_index("name")
+    bearing_table["type"] = bearing_table["type"].str.lower()
+    _check_types(bearing_table["type"], "bearings")
+
+    def envelope(envelopes, nodes, bound):
+        return (
+            envelopes.xs((limit_state, bound), level=[1, 2])
+            .astype(float)
+            .reindex(nodes)
+            .to_numpy()
+        )
+
+    reaction_nodes = bearing_table["nodes"].str[0]
+    displacement_nodes = bearing_table["nodes"].str[1]
+
+    if bearings_by_type is not None:
+        node_types = {
+            node: bearing_type
+            for bearing_type, nodes in bearings_by_type.items()
+            for node in nodes
+        }
+        listed = reaction_nodes.map(node_types)
+        differs = listed.notna() & (listed != bearing_table["type"])
+        if differs.any():
+            raise ValueError(
+                "Bearing type differs from bearings_by_type for: "
+                + ", ".join(
+                    f"{name} ({bearing_table.loc[name, 'type']} / {listed[name]})"
+                    for name in bearing_table.index[differs]
+                )
+            )
+    reaction_columns = list(reaction_envelopes.columns)
+    disp_columns = list(displacement_envelopes.columns)
+
+    r_max = pd.DataFrame(
+        envelope(reaction_envelopes, reaction_nodes, "max"), columns=reaction_columns
+    )
+    r_min = pd.DataFrame(
+        envelope(reaction_envelopes, reaction_nodes, "min"), columns=reaction_columns
+    )
+    d_max = pd.DataFrame(
+        envelope(displacement_envelopes, displacement_nodes, "max"), columns=disp_columns
+    )
+    d_min = pd.DataFrame(
+        envelope(displacement_envelopes, displacement_nodes, "min"), columns=disp_columns
+    )
+
+    def absmax(dof, maxima, minima):
+        return np.maximum(maxima[dof].abs(), minima[dof].abs()).to_numpy()
+
+    requirements = pd.DataFrame(
+        {
+            "type": bearing_table["type"].to_numpy(),
+            "N_max": r_max["Fz"].to_numpy(),
+            "N_min": r_min["Fz"].to_numpy(),
+            "Vx": absmax("Fx", r_max, r_min),
+            "Vy": absmax("Fy", r_max, r_min),
+            "ux": absmax("Dx", d_max, d_min),
+            "uy": absmax("Dy", d_max, d_min),
+            "rotation": np.maximum(
+                absmax("Rx", d_max, d_min), absmax("Ry", d_max, d_min)
+            ),
+        },
+        index=bearing_table.index,
+    )
+
+    return requirements
+
+
+def select_bearings(catalogue, requirements):
+    '''
+    Select the smallest adequate product for every bearing
+
+    Parameters:
+    ------------
+    catalogue: dict
+        bearing catalogue, see load_catalogue
+    requirements: DataFrame
+        bearing requirements, see bearing_requirements
+
+    Returns:
+    ---------
+    selection: DataFrame
+        requirements with the selected 'product' (NaN if no product is
+        adequate) and its vertical utilisation 'N_util'
+    '''
+    selection = requirements.copy()
+    selection["product"] = np.nan
+    selection["product"] = selection["product"].astype(object)
+    selection["N_util"] = np.nan
+
+    _check_types(catalogue.keys(), "catalogue")
+    for bearing_type, products in catalogue.items():
+        rows = (selection["type"] == bearing_type).to_numpy()
+        if not rows.any():
+            continue
+        required = selection.loc[rows]
+
+        # products below the search position are too small for N_max
+        start = np.searchsorted(products["N_max"], required["N_max"].to_numpy())
+        adequate = np.arange(len(products["N_max"]))[None, :] >= start[:, None]
+
+        adequate &= products["N_min"][None, :] <= required["N_min"].to_numpy()[:, None]
+        for capacity in ["rotation"] + TYPE_CHECKS[bearing_type]:
+            adequate &= (
+                products[capacity][None, :] >= required[capacity].to_numpy()[:, None]
+            )
+
+        found = adequate.any(axis=1)
+        first = adequate.argmax(axis=1)
+
+        selection.loc[rows, "product"] = np.where(
+            found, products["product"][first], np.nan
+        )
+        selection.loc[rows, "N_util"] = np.where(
+            found, required["N_max"].to_numpy() / products["N_max"][first], np.nan
+        )
+
+    missing = selection["product"].isna()
+    if missing.any():
+        print(f'\nNo adequate product for bearings: {list(selection.index[missing])}')
+
+    return selection
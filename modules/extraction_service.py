@@ -0,0 +1,484 @@
+import json
+import os
+import queue
+import sys
+import socket
+import socketserver
+import threading
+from concurrent.futures import Future
+import pandas as pd
+
+
+"""
+Local extraction service with pooled model sessions.
+
+Opening a GSA model costs far more than extracting the bearing results, so
+the service keeps a pool of opened sessions for each model and serves
+batched node/case requests over a local socket. Requests for the same
+(model, result, node, case) are coalesced: in-flight requests are shared
+and completed results are cached. The cache is keyed on the modification
+time and size of the model files, so when a model is re-solved its
+sessions are reopened and its cached results are dropped.
+
+Protocol: one JSON object per line, e.g.
+
+    {"model": "static", "result": "reactions", "nodes": [17027], "cases": ["C11", "C99"]}
+
+answered with
+
+    {"results": [[17027, "C11", [Fx, Fy, Fz, Mx, My, Mz]]],
+     "errors": [[17027, "C99", "KeyError: ..."]]}
+
+A (node, case) that cannot be extracted is reported in 'errors' and does
+not fail the other results of the request.
+
+Start the service with the csv backend:
+
+    python -m modules.extraction_service
+
+or with the GSA models, where GSA is installed:
+
+    python -m modules.extraction_service gsa
+"""
+
+
+HOST = "127.0.0.1"
+PORT = 50731
+RESULTS = ["reactions", "displacements"]
+
+GSA_MODELS = {
+    "static": "models/WBBn_base_v48_base.gwb",
+    "traffic": "models/WBBn_base_v48_traffic (Node effects)_solved.gwb",
+}
+
+
+# ============================================================================
+# Model backends
+# ============================================================================
+
+
+def read_gsa_results(filename, columns):
+    '''
+    Read results table between START_TABLE and END_TABLE of a GSA .csv export
+
+    Parameters:
+    ------------
+    filename: str
+        path to GSA .csv export
+    columns: list
+        result columns to keep, in order
+
+    Returns:
+    ---------
+    results: DataFrame
+        results indexed by (node, case)
+    '''
+    with open(filename, encoding="utf-8-sig") as f:
+        lines = f.readlines()
+    start = next(i for i, line in enumerate(lines) if line.startswith("START_TABLE"))
+    end = next(i for i, line in enumerate(lines) if line.startswith("END_TABLE"))
+
+    # START_TABLE line, units row, then the header row
+    df = pd.read_csv(filename, skiprows=start + 2, nrows=end - start - 3, encoding="utf-8-sig")
+    df.dropna(subset=["Case"], inplace=True)
+    df["Node"] = pd.to_numeric(df["Node"]).astype(int)
+
+    results = df.set_index(["Node", "Case"])[columns].astype(float)
+    results.index.set_names(["node", "case"], inplace=True)
+    return results
+
+
+def read_gsa_table(filename, columns):
+    '''
+    Read results of a GSA .csv export as {(node, case): tuple of results}
+    '''
+    results = read_gsa_results(filename, columns)
+    return dict(zip(results.index, map(tuple, results.to_numpy())))
+
+
+class CsvBackend:
+    '''
+    Model session backed by GSA .csv exports, with the same result methods
+    as gsapy.GSA. Displacements are returned in m like gsapy.
+    '''
+
+    def __init__(self, reactions_csv, displacements_csv):
+        self.reactions = read_gsa_table(
+            reactions_csv, ["Fx", "Fy", "Fz", "Mxx", "Myy", "Mzz"]
+        )
+        displacements = read_gsa_table(
+            displacements_csv, ["Ux", "Uy", "Uz", "Rxx", "Ryy", "Rzz"]
+        )
+        # exports are in mm and rad
+        self.displacements = {
+            key: tuple(value / 1000 for value in disp[:3]) + disp[3:]
+            for key, disp in displacements.items()
+        }
+
+    def get_node_reactions(self, node, case):
+        return self.reactions[(node, case)]
+
+    def get_node_displacements(self, node, case):
+        return self.displacements[(node, case)]
+
+
+def gsa_backend(filename):
+    '''
+    Open GSA model session, gsapy is only available where GSA is installed
+    '''
+    from gsapy import GSA
+
+    return GSA(filename)
+
+
+# ============================================================================
+# Session pool and request coalescing
+# ============================================================================
+
+
+def model_version(files):
+    '''
+    Version of a model from the modification time and size of its files
+    '''
+    return tuple((os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in files)
+
+
+class SessionPool:
+    '''
+    Pool of opened sessions of one model. Sessions are opened once and a
+    session serves one request at a time. A retired pool closes its
+    sessions when its last request is released.
+    '''
+
+    def __init__(self, factory, size=2):
+        self.opened = [factory() for _ in range(size)]
+        self.sessions = queue.Queue()
+        for session in self.opened:
+            self.sessions.put(session)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.retired = False
+        self.closed = False
+
+    def acquire(self):
+        with self.lock:
+            self.active += 1
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+            close = self.retired and self.active == 0
+        if close:
+            self.close()
+
+    def retire(self):
+        with self.lock:
+            self.retired = True
+            close = self.active == 0
+        if close:
+            self.close()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        for session in self.opened:
+            close = getattr(session, "close", None)
+            if close is not None:
+                close()
+
+    def extract(self, result, keys):
+        '''
+        Extract results of (node, case) keys
+
+        Returns:
+        ---------
+        values: list
+            results of each key, or the exception raised for the key
+        '''
+        session = self.sessions.get()
+        try:
+            if result == "reactions":
+                get = session.get_node_reactions
+            else:
+                get = session.get_node_displacements
+            values = []
+            for node, case in keys:
+                try:
+                    values.append(get(node, case))
+                except Exception as error:
+                    values.append(error)
+            return values
+        finally:
+            self.sessions.put(session)
+
+
+class Extractor:
+    '''
+    Serve batched requests from the session pools, sharing in-flight and
+    completed results between clients
+
+    Parameters:
+    ------------
+    models: dict
+        model name and (function that opens a session of the model, list
+        of model files)
+    pool_size: int
+        number of sessions opened for each model
+    '''
+
+    def __init__(self, models, pool_size=2):
+        self.models = models
+        self.pool_size = pool_size
+        self.pools = {}
+        self.versions = {}
+        self.futures = {}
+        self.lock = threading.Lock()
+
+    def pool(self, model):
+        '''
+        Session pool and version of a model, reopened when its files changed.
+        The pool is acquired for the caller, release it when done. Sessions
+        are opened outside the lock, so a slow open does not block requests
+        for other models, and the replaced pool is closed once its requests
+        are done.
+        '''
+        factory, files = self.models[model]
+        while True:
+            version = model_version(files)
+            with self.lock:
+                if self.versions.get(model) == version:
+                    pool = self.pools[model]
+                    pool.acquire()
+                    return pool, version
+
+            opened = SessionPool(factory, self.pool_size)
+            with self.lock:
+                if model_version(files) != version:
+                    # changed again while opening, open the newer version
+                    replaced = opened
+                elif self.versions.get(model) == version:
+                    # another request opened this version first
+                    replaced = opened
+                else:
+                    replaced = self.pools.get(model)
+                    self.pools[model] = opened
+                    self.versions[model] = version
+                    self.futures = {
+                        key: future for key, future in self.futures.items() if key[0] != model
+                    }
+            if replaced is not None:
+                replaced.retire()
+
+    def get_results(self, model, result, nodes, cases):
+        '''
+        Returns:
+        ---------
+        results: list
+            [node, case, values] of each extracted key
+        errors: list
+            [node, case, message] of each key that could not be extracted
+        '''
+        if model not in self.models:
+            raise KeyError(f"Unknown model '{model}'")
+        if result not in RESULTS:
+            raise KeyError(f"Unknown result '{result}', use one of {RESULTS}")
+
+        pool, version = self.pool(model)
+        try:
+            keys = [(model, version, result, node, case) for node in nodes for case in cases]
+
+            # claim the keys nobody has requested yet, reuse the others
+            with self.lock:
+                claimed, claimed_futures = [], []
+                for key in keys:
+                    if key not in self.futures:
+                        self.futures[key] = Future()
+                        claimed.append(key)
+                        claimed_futures.append(self.futures[key])
+                futures = [self.futures[key] for key in keys]
+
+            if claimed:
+                try:
+                    values = pool.extract(result, [key[3:] for key in claimed])
+                except Exception as error:
+                    values = [error] * len(claimed)
+                with self.lock:
+                    for key, value in zip(claimed, values):
+                        if isinstance(value, Exception):
+                            # failed keys are not cached, so they are tried again
+                            self.futures.pop(key, None)
+                for future, value in zip(claimed_futures, values):
+                    if isinstance(value, Exception):
+                        future.set_exception(value)
+                    else:
+                        future.set_result(value)
+        finally:
+            pool.release()
+
+        results, errors = [], []
+        for (_, _, _, node, case), future in zip(keys, futures):
+            error = future.exception()
+            if error is None:
+                results.append([node, case, list(future.result())])
+            else:
+                errors.append([node, case, f"{type(error).__name__}: {error}"])
+        return results, errors
+
+
+# ============================================================================
+# Server and client
+# ============================================================================
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                results, errors = self.server.extractor.get_results(
+                    request["model"],
+                    request["result"],
+                    request["nodes"],
+                    request["cases"],
+                )
+                response = {"results": results, "errors": errors}
+            except Exception as error:
+                response = {"error": f"{type(error).__name__}: {error}"}
+            self.wfile.write((json.dumps(response) + "\n").encode())
+
+
+class ExtractionServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, models, host=HOST, port=PORT, pool_size=2):
+        self.extractor = Extractor(models, pool_size)
+        super().__init__((host, port), _RequestHandler)
+
+
+def serve(models, host=HOST, port=PORT, pool_size=2):
+    '''
+    Open the model sessions and serve requests until interrupted
+
+    Parameters:
+    ------------
+    models: dict
+        model name and (function that opens a session of the model, list
+        of model files)
+    host: str
+        local address to listen on
+    port: int
+        port to listen on
+    pool_size: int
+        number of sessions opened for each model
+    '''
+    with ExtractionServer(models, host, port, pool_size) as server:
+        print(f"\nExtraction service listening on {host}:{port}")
+        server.serve_forever()
+
+
+class ExtractionClient:
+    '''
+    Client of the extraction service
+    '''
+
+    def __init__(self, host=HOST, port=PORT):
+        self.connection = socket.create_connection((host, port))
+        self.stream = self.connection.makefile("rwb")
+
+    def get_results(self, model, result, nodes, cases):
+        '''
+        Get results of all nodes and cases in one request
+
+        Returns:
+        ---------
+        results: dict
+            {node: {case: tuple of results}}
+        errors: dict
+            {(node, case): message} of the keys that could not be extracted
+        '''
+        request = {"model": model, "result": result, "nodes": nodes, "cases": cases}
+        self.stream.write((json.dumps(request) + "\n").encode())
+        self.stream.flush()
+        response = json.loads(self.stream.readline())
+        if "error" in response:
+            raise RuntimeError(response["error"])
+
+        results = {}
+        for node, case, values in response["results"]:
+            results.setdefault(node, {})[case] = tuple(values)
+        errors = {(node, case): message for node, case, message in response["errors"]}
+        return results, errors
+
+    def model(self, name):
+        return RemoteModel(self, name)
+
+    def close(self):
+        self.stream.close()
+        self.connection.close()
+
+
+class RemoteModel:
+    '''
+    Stand-in for gsapy.GSA that gets results from the extraction service.
+    Use prefetch to get all nodes and cases of a run in one request.
+    '''
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.cache = {result: {} for result in RESULTS}
+        self.errors = {result: {} for result in RESULTS}
+
+    def prefetch(self, result, nodes, cases):
+        results, errors = self.client.get_results(self.name, result, nodes, cases)
+        for node, values in results.items():
+            for case, value in values.items():
+                self.cache[result][(node, case)] = value
+        self.errors[result].update(errors)
+
+    def _get(self, result, node, case):
+        if (node, case) not in self.cache[result]:
+            self.prefetch(result, [node], [case])
+        if (node, case) not in self.cache[result]:
+            raise KeyError(
+                f"No {result} for node {node}, case {case}: "
+                f"{self.errors[result].get((node, case))}"
+            )
+        return self.cache[result][(node, case)]
+
+    def get_node_reactions(self, node, case):
+        return self._get("reactions", node, case)
+
+    def get_node_displacements(self, node, case):
+        return self._get("displacements", node, case)
+
+
+def csv_models():
+    '''
+    Models served from the GSA csv exports in data/
+    '''
+    models = {}
+    for name in ["static", "traffic"]:
+        files = [f"data/{name}_reactions.csv", f"data/{name}_displacements.csv"]
+        models[name] = (lambda files=files: CsvBackend(*files), files)
+    return models
+
+
+def gsa_models(filenames=GSA_MODELS):
+    '''
+    Models served from GSA model files
+    '''
+    return {
+        name: (lambda filename=filename: gsa_backend(filename), [filename])
+        for name, filename in filenames.items()
+    }
+
+
+if __name__ == "__main__":
+    backend = sys.argv[1] if len(sys.argv) > 1 else "csv"
+    if backend not in ["csv", "gsa"]:
+        raise SystemExit(f"Unknown backend '{backend}', use 'csv' or 'gsa'")
+    serve(gsa_models() if backend == "gsa" else csv_models())
@@ -0,0 +1,237 @@
+import pandas as pd
+import numpy as np
+
+
+"""
+Batched what-if evaluation of load factor sets.
+
+Alternative partial factors (national annexes, client specified psi
+factors, sensitivity sweeps) are evaluated together against the load type
+effects of each node (see reaction_load_effects in bearing_schedule.py)
+in a single broadcast computation:
+
+    combination[variant, node, comb, dof] =
+        sum over load of factor[variant, comb, load] * effect[node, bound(comb), load, dof]
+"""
+
+
+LOADS = ["G", "LM1", "W", "T"]
+
+
+def stack_factor_sets(variants, max_combs):
+    '''
+    Stack factor dictionaries of several variants into one table
+
+    Parameters:
+    ------------
+    variants: dict
+        dictionary of variant id and factor dictionary, each factor dictionary
+        with the same layout as reaction_factors:
+        {comb: {'name': str, 'type': str, 'G': float, 'LM1': float, ...}}
+    max_combs: list
+        combinations that use the maximum load type effects, all other
+        combinations use the minimum effects
+
+    Returns:
+    ---------
+    factor_sets: DataFrame
+        factors indexed by (variant, combination) with columns =
+        ['name', 'limit_state', 'bound', 'G', 'LM1', 'W', 'T']
+    '''
+    rows = {}
+    for variant, factors in variants.items():
+        for comb, factor in factors.items():
+            rows[(variant, comb)] = {
+                "name": factor["name"],
+                "limit_state": factor["type"],
+                "bound": "max" if comb in max_combs else "min",
+                **{load: factor[load] for load in LOADS},
+            }
+
+    factor_sets = pd.DataFrame(rows).T
+    factor_sets.index.set_names(["variant", "combination"], inplace=True)
+    factor_sets[LOADS] = factor_sets[LOADS].astype(float)
+
+    return factor_sets
+
+
+def read_factor_sets(filename, max_combs, case="reaction"):
+    '''
+    Read factor sets from .csv file with the same layout as load_factors.csv
+    and an additional 'variant' column
+
+    Parameters:
+    ------------
+    filename: str
+        path to factor sets .csv file
+    max_combs: list
+        combinations that use the maximum load type effects
+    case: str
+        'reaction' or 'displacement'
+
+    Returns:
+    ---------
+    factor_sets: DataFrame
+        see stack_factor_sets
+    '''
+    df = pd.read_csv(filename)
+    df = df.loc[df["case"] == case]
+
+    factor_sets = df.set_index(["variant", "combination"])
+    factor_sets["limit_state"] = factor_sets["limit_state"].str.upper()
+    factor_sets["bound"] = np.where(
+        factor_sets.index.get_level_values("combination").isin(max_combs), "max", "min"
+    )
+    factor_sets[LOADS] = factor_sets[LOADS].astype(float)
+
+    return factor_sets[["name", "limit_state", "bound"] + LOADS]
+
+
+def sweep_factor(factors, load, multipliers):
+    '''
+    Generate variants that scale the factor of one load type, e.g. a
+    sensitivity sweep on LM1 or T
+
+    Parameters:
+    ------------
+    factors: dict
+        base factor dictionary, same layout as reaction_factors
+    load: str
+        load type to scale, one of 'G', 'LM1', 'W', 'T'
+    multipliers: list
+        multipliers applied to the base factor of the load type
+
+    Returns:
+    ---------
+    variants: dict
+        dictionary of variant id and factor dictionary
+    '''
+    variants = {}
+    for multiplier in multipliers:
+        variants[f"{load}x{multiplier:g}"] = {
+            comb: {**factor, load: factor[load] * multiplier}
+            for comb, factor in factors.items()
+        }
+    return variants
+
+
+def check_variant_layout(factor_sets):
+    '''
+    Check that the rows of every variant are one block holding the same
+    combinations, in the same order and with the same name, limit state and
+    bound as the first variant
+
+    Parameters:
+    ------------
+    factor_sets: DataFrame
+        factor sets indexed by (variant, combination), see stack_factor_sets
+
+    Returns:
+    ---------
+    variants: Index
+        variant ids in row order
+    n_combs: int
+        number of combinations of each variant
+    '''
+    variant_labels = factor_sets.index.get_level_values("variant")
+    variants = variant_labels.unique()
+    n_combs = len(factor_sets) // len(variants)
+
+    layout = factor_sets.reset_index("combination")[
+        ["combination", "name", "limit_state", "bound"]
+    ].to_numpy(dtype=object)
+    reference = layout[:n_combs]
+    if n_combs * len(variants) != len(factor_sets):
+        raise ValueError("All factor set variants must define the same combinations")
+
+    expected_variants = np.repeat(variants.to_numpy(), n_combs)
+    differs = (variant_labels.to_numpy() != expected_variants) | (
+        layout != np.tile(reference, (len(variants), 1))
+    ).any(axis=1)
+    if differs.any():
+        row = int(np.argmax(differs))
+        raise ValueError(
+            f"Factor set variant '{variant_labels[row]}' row {row % n_combs} is "
+            f"{list(layout[row])}, expected variant '{expected_variants[row]}' with "
+            f"{list(reference[row % n_combs])} as in variant '{variants[0]}'"
+        )
+
+    return variants, n_combs
+
+
+def evaluate_factor_sets(load_effects, factor_sets):
+    '''
+    Evaluate all factor sets against the load type effects of all nodes
+
+    Parameters:
+    ------------
+    load_effects: DataFrame
+        load type effects indexed by (node, bound, load) with one column per dof
+    factor_sets: DataFrame
+        factor sets indexed by (variant, combination), see stack_factor_sets
+
+    Returns:
+    ---------
+    combinations: DataFrame
+        combined results indexed by (variant, node, limit_state, combination)
+        with columns = ['name'] + dofs
+    envelopes: DataFrame
+        max and min of the combinations indexed by
+        (variant, node, limit_state, max/min)
+    '''
+    dofs = list(load_effects.columns)
+    nodes = load_effects.index.get_level_values("node").unique()
+
+    # effects[node, bound, load, dof]
+    full_index = pd.MultiIndex.from_product(
+        [nodes, ["max", "min"], LOADS], names=["node", "bound", "load"]
+    )
+    effects = (
+        load_effects.reindex(full_index)
+        .to_numpy(dtype=float)
+        .reshape(len(nodes), 2, len(LOADS), len(dofs))
+    )
+
+    # factors[variant x comb, load] with the bound each row uses
+    factors = factor_sets[LOADS].to_numpy(dtype=float)
+    bound = (factor_sets["bound"] == "min").to_numpy().astype(int)
+
+    # results for both bounds, then keep the bound of each combination
+    results = np.einsum("kl,nbld->nbkd", factors, effects)
+    results = results[:, bound, np.arange(len(factor_sets)), :]
+
+    # every variant holds the same combinations, rows are ordered by
+    # (variant, node, combination)
+    variants, n_combs = check_variant_layout(factor_sets)
+
+    v_idx, n_idx, c_idx = (
+        idx.ravel()
+        for idx in np.meshgrid(
+            np.arange(len(variants)),
+            np.arange(len(nodes)),
+            np.arange(n_combs),
+            indexing="ij",
+        )
+    )
+    k_idx = v_idx * n_combs + c_idx
+
+    index = pd.MultiIndex.from_arrays(
+        [
+            factor_sets.index.get_level_values("variant")[k_idx],
+            nodes[n_idx],
+            factor_sets["limit_state"].to_numpy()[k_idx],
+            factor_sets.index.get_level_values("combination")[k_idx],
+        ],
+        names=["variant", "node", "limit_state", "combination"],
+    )
+    combinations = pd.DataFrame(results[n_idx, k_idx], index=index, columns=dofs)
+    combinations.insert(0, "name", factor_sets["name"].to_numpy()[k_idx])
+
+    envelopes = (
+        combinations[dofs]
+        .groupby(level=["variant", "node", "limit_state"], sort=False)
+        .agg(["max", "min"])
+        .stack()
+    )
+
+    return combinations, envelopes
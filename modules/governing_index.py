@@ -0,0 +1,406 @@
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pandas as pd
+import numpy as np
+
+
+"""
+Index of the governing combination results of each bearing, built after
+every run and queried without filtering the excel sheets.
+
+The index is keyed by (bearing, limit state, dof, sign), e.g.
+('p10_w_free', 'SLS', 'Fz', 'min') for uplift at p10_w in SLS, and
+returns the governing value, its combination and the load cases that
+contribute to it. A contribution is 'mirrored' when its effect is the
+negative of the case result, e.g. min W = -max W. Lookups are dictionary
+lookups.
+
+Query it from python:
+
+    index = governing_index.GoverningIndex.load("output/governing_index.json")
+    index.lookup("p10_w_free", "SLS", "Fz", "min")
+
+or start the local JSON endpoint
+
+    python -m modules.governing_index output/governing_index.json
+
+and request
+
+    http://127.0.0.1:50732/governing?bearing=p10_w_free&limit_state=SLS&dof=Fz&sign=min
+
+Leave out any of bearing, limit_state, dof and sign to list all matches.
+"""
+
+
+HOST = "127.0.0.1"
+PORT = 50732
+KEYS = ["bearing", "limit_state", "dof", "sign"]
+LOADS = ["G", "LM1", "W", "T"]
+
+
+def _key(bearing, limit_state, dof, sign):
+    return tuple(str(part).lower() for part in [bearing, limit_state, dof, sign])
+
+
+# ============================================================================
+# Build the index
+# ============================================================================
+
+
+def _signs(sign, dofs):
+    if isinstance(sign, dict):
+        sign = [sign.get(dof, 1) for dof in dofs]
+    return np.broadcast_to(np.asarray(sign, dtype=float), (len(dofs),))
+
+
+def derive_load_effects(results_by_node, nodes, dofs, load_types, derivations):
+    '''
+    Load type effects of each node from the case results, as declared in
+    derivations. contributing_cases credits the cases of the effects from
+    the same derivations.
+
+    Parameters:
+    ------------
+    results_by_node: dict
+        Dictionary of Dataframes with results for each node, indexed by load
+        type
+    nodes: list
+        nodes of the effects
+    dofs: list
+        result columns
+    load_types: dict
+        load of the effects and its load type, e.g. {'G': 'G_Perm'}
+    derivations: dict
+        derivation of each effect, {(bound, load): (extreme, sign)} with
+        extreme = 'max' or 'min' of the case results and sign = 1 or -1, or a
+        dict of the sign of each dof, e.g. {('min', 'T'): ('max', -1)}. None
+        for an effect of zero.
+
+    Returns:
+    ---------
+    load_effects: DataFrame
+        effects indexed by (node, bound, load)
+    '''
+    load_effects = {}
+    for node in nodes:
+        for (bound, load), derivation in derivations.items():
+            if derivation is None:
+                load_effects[(node, bound, load)] = pd.Series(0.0, index=dofs)
+                continue
+            extreme, sign = derivation
+            values = results_by_node[node].loc[load_types[load], dofs].astype(float)
+            value = values.max() if extreme == "max" else values.min()
+            load_effects[(node, bound, load)] = value * _signs(sign, dofs)
+
+    load_effects = pd.DataFrame(load_effects).T.astype(float)
+    load_effects.index.set_names(["node", "bound", "load"], inplace=True)
+    return load_effects
+
+
+def contributing_cases(results, load_effects, load_types, derivations, rtol=1e-6):
+    '''
+    Load case of each load type effect, following how the effect was derived
+    from the case results: the case with the max or min result of the load
+    type, mirrored where the effect is the negative of that result, e.g.
+    min W = -max W. Effects that do not follow their derivation, e.g. the
+    minimum braking loads, have no case.
+
+    Parameters:
+    ------------
+    results: DataFrame
+        results indexed by load type with columns = ['node', 'case'] + dofs,
+        rows ordered by node then case, see result_tables.results_table
+    load_effects: DataFrame
+        effects indexed by (node, bound, load), see reaction_load_effects
+    load_types: dict
+        load of the effects and its load type, e.g. {'G': 'G_Perm'}
+    derivations: dict
+        derivation of each effect, {(bound, load): (extreme, sign)} with
+        extreme = 'max' or 'min' of the case results and sign = 1 or -1, or a
+        dict of the sign of each dof, e.g. {('min', 'T'): ('max', -1)}, see
+        derive_load_effects
+    rtol: float
+        relative tolerance of the match
+
+    Returns:
+    ---------
+    cases: DataFrame
+        case of each effect, same index and columns as load_effects, None
+        where no case matches
+    mirrored: DataFrame
+        True where the effect is the negative of the case result
+    '''
+    nodes = list(load_effects.index.unique(level="node"))
+    dofs = list(load_effects.columns)
+
+    cases = pd.DataFrame(None, index=load_effects.index, columns=dofs, dtype=object)
+    mirrored = pd.DataFrame(False, index=load_effects.index, columns=dofs)
+    for (bound, load), derivation in derivations.items():
+        if derivation is None or load not in load_effects.index.unique(level="load"):
+            continue
+        extreme, sign = derivation
+        rows = results.loc[[load_types[load]]]
+        rows = rows.loc[rows["node"].isin(nodes)]
+        labels = rows["case"].to_numpy().reshape(len(nodes), -1)
+        # values[node, case, dof] and effects[node, dof]
+        values = rows[dofs].to_numpy(dtype=float).reshape(len(nodes), -1, len(dofs))
+        index = pd.MultiIndex.from_product([nodes, [bound], [load]])
+        effects = load_effects.loc[index].to_numpy(dtype=float)
+
+        signs = _signs(sign, dofs)
+
+        position = values.argmax(axis=1) if extreme == "max" else values.argmin(axis=1)
+        value = np.take_along_axis(values, position[:, None, :], axis=1)[:, 0, :]
+        match = np.isclose(signs * value, effects, rtol=rtol, atol=0)
+
+        case = np.where(match, labels[np.arange(len(nodes))[:, None], position], None)
+        cases.loc[index] = case
+        mirrored.loc[index] = match & (signs < 0)
+
+    return cases, mirrored
+
+
+def governing_results(combinations, factors, max_combs, load_effects, cases, mirrored):
+    '''
+    Governing combination of each node, limit state, dof and sign
+
+    Parameters:
+    ------------
+    combinations: DataFrame
+        combinations indexed by node with columns =
+        ['limit_state', 'combination', 'name'] + dofs, see combine_reactions
+    factors: dict
+        combination factors, {comb: {'G': float, 'LM1': float, ...}}
+    max_combs: list
+        combinations that use the maximum load type effects
+    load_effects: DataFrame
+        effects indexed by (node, bound, load)
+    cases, mirrored: DataFrame
+        case of each effect and whether the effect is the negative of the
+        case result, see contributing_cases
+
+    Returns:
+    ---------
+    governing: DataFrame
+        indexed by (node, limit_state, dof, sign) with columns = ['value',
+        'combination', 'name', 'cases'], cases is a list of
+        {'load', 'case', 'mirrored', 'factor', 'effect'} of the loads
+        contributing to the value
+    '''
+    dofs = list(load_effects.columns)
+    long = (
+        combinations.reset_index()
+        .melt(id_vars=["node", "limit_state", "combination", "name"], value_vars=dofs, var_name="dof")
+        .astype({"value": float})
+    )
+    by_group = long.groupby(["node", "limit_state", "dof"], sort=False)["value"]
+    governing = pd.concat(
+        {"max": long.loc[by_group.idxmax()], "min": long.loc[by_group.idxmin()]},
+        names=["sign"],
+    ).reset_index(level="sign")
+
+    records = []
+    for row in governing.itertuples(index=False):
+        bound = "max" if row.combination in max_combs else "min"
+        contributions = []
+        for load in LOADS:
+            factor = float(factors[row.combination][load])
+            effect = float(load_effects.loc[(row.node, bound, load), row.dof])
+            if factor * effect != 0:
+                case = cases.loc[(row.node, bound, load), row.dof]
+                contributions.append(
+                    {
+                        "load": load,
+                        "case": case,
+                        "mirrored": bool(mirrored.loc[(row.node, bound, load), row.dof]),
+                        "factor": factor,
+                        "effect": effect,
+                    }
+                )
+        records.append(contributions)
+    governing["cases"] = records
+
+    return governing.set_index(["node", "limit_state", "dof", "sign"])[
+        ["value", "combination", "name", "cases"]
+    ]
+
+
+def build_index(bearings, governing):
+    '''
+    Index of the governing results of each bearing
+
+    Parameters:
+    ------------
+    bearings: dict
+        bearings with 'name' and 'nodes' = [reaction node, displacement node]
+    governing: dict
+        governing results of 'reactions' and 'displacements', see
+        governing_results
+
+    Returns:
+    ---------
+    index: GoverningIndex
+    '''
+    records = []
+    for bearing in bearings.values():
+        for position, result in enumerate(["reactions", "displacements"]):
+            node = bearing["nodes"][position]
+            if node not in governing[result].index.get_level_values("node"):
+                continue
+            for (limit_state, dof, sign), row in governing[result].loc[node].iterrows():
+                records.append(
+                    {
+                        "bearing": bearing["name"],
+                        "limit_state": limit_state,
+                        "dof": dof,
+                        "sign": sign,
+                        "node": int(node),
+                        "value": float(row["value"]),
+                        "combination": row["combination"],
+                        "name": row["name"],
+                        "cases": row["cases"],
+                    }
+                )
+    return GoverningIndex(records)
+
+
+# ============================================================================
+# Query API
+# ============================================================================
+
+
+class GoverningIndex:
+    '''
+    Governing results keyed by (bearing, limit state, dof, sign). Keys are
+    not case sensitive.
+    '''
+
+    def __init__(self, records):
+        self.records = {
+            _key(*(record[key] for key in KEYS)): record for record in records
+        }
+
+    def __len__(self):
+        return len(self.records)
+
+    def lookup(self, bearing, limit_state, dof, sign):
+        '''
+        Governing result of one key, e.g. lookup('p10_w_free', 'SLS', 'Fz', 'min')
+
+        Returns:
+        ---------
+        record: dict
+            'bearing', 'limit_state', 'dof', 'sign', 'node', 'value',
+            'combination', 'name' and 'cases'
+        '''
+        try:
+            return self.records[_key(bearing, limit_state, dof, sign)]
+        except KeyError:
+            raise KeyError(
+                f"No governing result for {(bearing, limit_state, dof, sign)}"
+            ) from None
+
+    def query(self, bearing=None, limit_state=None, dof=None, sign=None):
+        '''
+        Governing results matching the given parts of the key
+        '''
+        if None not in [bearing, limit_state, dof, sign]:
+            record = self.records.get(_key(bearing, limit_state, dof, sign))
+            return [record] if record else []
+
+        wanted = [
+            (i, str(part).lower())
+            for i, part in enumerate([bearing, limit_state, dof, sign])
+            if part is not None
+        ]
+        return [
+            record
+            for key, record in self.records.items()
+            if all(key[i] == part for i, part in wanted)
+        ]
+
+    def table(self):
+        '''
+        Index as a DataFrame for checking in excel
+        '''
+        return pd.DataFrame(list(self.records.values())).set_index(KEYS)
+
+    def save(self, filename):
+        with open(filename, "w") as f:
+            json.dump(list(self.records.values()), f, indent=1)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as f:
+            return cls(json.load(f))
+
+
+# ============================================================================
+# Local JSON endpoint
+# ============================================================================
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/governing":
+            return self.respond(404, {"error": f"Unknown path '{url.path}', use /governing"})
+
+        parameters = {key: values[0] for key, values in parse_qs(url.query).items()}
+        unknown = set(parameters) - set(KEYS)
+        if unknown:
+            return self.respond(
+                400, {"error": f"Unknown parameters {sorted(unknown)}, use {KEYS}"}
+            )
+
+        results = self.server.index.query(**parameters)
+        if not results:
+            return self.respond(404, {"error": f"No governing result for {parameters}"})
+        if len(parameters) == len(KEYS):
+            return self.respond(200, results[0])
+        return self.respond(200, {"results": results})
+
+    def respond(self, status, body):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GoverningServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, index, host=HOST, port=PORT):
+        self.index = index
+        super().__init__((host, port), _RequestHandler)
+
+
+def serve(index, host=HOST, port=PORT):
+    '''
+    Serve governing result queries until interrupted
+
+    Parameters:
+    ------------
+    index: GoverningIndex
+        index to serve
+    host: str
+        local address to listen on
+    port: int
+        port to listen on
+    '''
+    with GoverningServer(index, host, port) as server:
+        print(f"\nGoverning result index of {len(index)} results on http://{host}:{port}/governing")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    filename = sys.argv[1] if len(sys.argv) > 1 else "output/governing_index.json"
+    serve(GoverningIndex.load(filename))
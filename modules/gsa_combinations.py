@@ -0,0 +1,327 @@
+import re
+import pandas as pd
+import numpy as np
+
+
+"""
+Compile GSA combination definitions into a sparse combinations x cases
+matrix and evaluate every combination for every node in one product.
+
+GSA combination syntax, e.g.
+
+    C144 + A11 + A13 + A14
+    0.95238(C144) + A11 + A13
+    A43 - A44 + 0.35(1.2451(A41) - A46)
+    1.35A1 + 1.5A2 + C3
+
+References to other combinations (C) are expanded recursively, so each
+combination row only holds analysis cases (A).
+"""
+
+
+_TOKEN = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+)|([AC]\d+)|(.))")
+
+
+def _tokenize(description):
+    tokens = []
+    for number, case, symbol in _TOKEN.findall(description):
+        if number:
+            tokens.append(("number", float(number)))
+        elif case:
+            tokens.append(("case", case))
+        elif symbol.strip():
+            tokens.append(("symbol", symbol))
+    return tokens
+
+
+class _Parser:
+    '''
+    Recursive descent parser of one combination description
+
+        expression := term (('+' | '-') term)*
+        term       := ['+' | '-'] [number ['*']] (case | '(' expression ')')
+    '''
+
+    def __init__(self, description, resolve):
+        self.description = description
+        self.tokens = _tokenize(description)
+        self.position = 0
+        self.resolve = resolve
+
+    def parse(self):
+        terms = self.expression()
+        if self.position != len(self.tokens):
+            self.error("unexpected token")
+        return terms
+
+    def error(self, message):
+        raise ValueError(f"Cannot parse combination '{self.description}': {message}")
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def expression(self):
+        terms = self.term()
+        while self.peek() in [("symbol", "+"), ("symbol", "-")]:
+            sign = -1.0 if self.take()[1] == "-" else 1.0
+            for case, factor in self.term().items():
+                terms[case] = terms.get(case, 0.0) + sign * factor
+        return terms
+
+    def term(self):
+        factor = 1.0
+        if self.peek() in [("symbol", "+"), ("symbol", "-")]:
+            factor = -1.0 if self.take()[1] == "-" else 1.0
+        if self.peek()[0] == "number":
+            factor *= self.take()[1]
+            if self.peek() == ("symbol", "*"):
+                self.take()
+
+        kind, value = self.take()
+        if kind == "case":
+            terms = self.resolve(value)
+        elif (kind, value) == ("symbol", "("):
+            terms = self.expression()
+            if self.take() != ("symbol", ")"):
+                self.error("missing ')'")
+        else:
+            self.error("expected case or '('")
+
+        return {case: factor * case_factor for case, case_factor in terms.items()}
+
+
+def read_combination_definitions(filename):
+    '''
+    Read Combination Cases table of a GSA .csv export
+
+    Parameters:
+    ------------
+    filename: str
+        path to GSA combinations .csv export, e.g. data/static_combinations.csv
+
+    Returns:
+    ---------
+    definitions: DataFrame
+        indexed by combination case with columns = ['Name', 'Description']
+    '''
+    with open(filename, encoding="utf-8-sig") as f:
+        lines = f.readlines()
+    start = next(
+        i for i, line in enumerate(lines) if line.startswith("START_TABLE Combination")
+    )
+    end = next(i for i, line in enumerate(lines[start:]) if line.startswith("END_TABLE"))
+
+    df = pd.read_csv(filename, skiprows=start + 1, nrows=end - 2, encoding="utf-8-sig")
+    df = df.loc[df["Case"].astype(str).str.fullmatch(r"C\d+")]
+
+    return df.set_index("Case")[["Name", "Description"]]
+
+
+def compile_combinations(definitions, combinations=None):
+    '''
+    Compile combination definitions into a sparse combinations x cases matrix
+
+    Parameters:
+    ------------
+    definitions: dict or Series
+        combination case and GSA description, e.g. {'C11': 'C4 + A11 + A13'}
+    combinations: list
+        combinations to compile, all definitions if None. Combinations they
+        reference are expanded from definitions.
+
+    Returns:
+    ---------
+    matrix: dict
+        'combinations' and 'cases' labels of the rows and columns, and the
+        coordinate arrays 'rows', 'cols' and 'data' of the non-zero factors
+    '''
+    definitions = dict(definitions)
+    expanded = {}
+    expanding = set()
+
+    def resolve(case):
+        if case.startswith("A"):
+            return {case: 1.0}
+        if case in expanded:
+            return expanded[case]
+        if case not in definitions:
+            raise KeyError(f"Combination {case} is referenced but not defined")
+        if case in expanding:
+            raise ValueError(f"Combination {case} references itself")
+
+        expanding.add(case)
+        expanded[case] = _Parser(definitions[case], resolve).parse()
+        expanding.discard(case)
+        return expanded[case]
+
+    if combinations is None:
+        combinations = list(definitions.keys())
+    combinations = list(combinations)
+    terms = [resolve(combination) for combination in combinations]
+
+    cases = sorted({case for term in terms for case in term}, key=lambda c: int(c[1:]))
+    case_index = {case: i for i, case in enumerate(cases)}
+
+    rows, cols, data = [], [], []
+    for row, term in enumerate(terms):
+        for case, factor in term.items():
+            if factor != 0:
+                rows.append(row)
+                cols.append(case_index[case])
+                data.append(factor)
+
+    return {
+        "combinations": combinations,
+        "cases": cases,
+        "rows": np.asarray(rows, dtype=np.int64),
+        "cols": np.asarray(cols, dtype=np.int64),
+        "data": np.asarray(data, dtype=float),
+    }
+
+
+def combination_table(matrix):
+    '''
+    Dense combinations x cases table of the matrix, for checking in excel
+    '''
+    table = np.zeros((len(matrix["combinations"]), len(matrix["cases"])))
+    table[matrix["rows"], matrix["cols"]] = matrix["data"]
+    return pd.DataFrame(table, index=matrix["combinations"], columns=matrix["cases"])
+
+
+def evaluate_combinations(matrix, case_results):
+    '''
+    Evaluate every combination for every node in one sparse product
+
+    Parameters:
+    ------------
+    matrix: dict
+        compiled combinations, see compile_combinations
+    case_results: DataFrame
+        analysis case results indexed by (node, case) with one column per dof
+
+    Returns:
+    ---------
+    combined: DataFrame
+        combination results indexed by (node, case) with one column per dof.
+        Combinations using a case without results are NaN.
+    '''
+    nodes = case_results.index.get_level_values("node").unique()
+    dofs = list(case_results.columns)
+
+    # results[case, node x dof]
+    index = pd.MultiIndex.from_product([nodes, matrix["cases"]], names=["node", "case"])
+    results = (
+        case_results.reindex(index)
+        .to_numpy(dtype=float)
+        .reshape(len(nodes), len(matrix["cases"]), len(dofs))
+        .transpose(1, 0, 2)
+        .reshape(len(matrix["cases"]), -1)
+    )
+
+    combined = np.zeros((len(matrix["combinations"]), results.shape[1]))
+    np.add.at(combined, matrix["rows"], matrix["data"][:, None] * results[matrix["cols"]])
+
+    combined = combined.reshape(len(matrix["combinations"]), len(nodes), len(dofs))
+    return pd.DataFrame(
+        combined.transpose(1, 0, 2).reshape(-1, len(dofs)),
+        index=pd.MultiIndex.from_product(
+            [nodes, matrix["combinations"]], names=["node", "case"]
+        ),
+        columns=dofs,
+    )
+
+
+def rounding_error(values, figures=4):
+    '''
+    Largest rounding error of values rounded to significant figures, half a
+    unit of the last figure, zero for zero values
+    '''
+    values = np.abs(np.asarray(values, dtype=float))
+    exponent = np.floor(np.log10(np.where(values > 0, values, 1.0)))
+    return np.where(values > 0, 0.5 * 10.0 ** (exponent - figures + 1), 0.0)
+
+
+def rounding_tolerance(matrix, case_results, figures=4, noise=1e-9):
+    '''
+    Largest difference of each evaluated combination from the exact value
+    due to the rounding of the analysis case results, the sum of
+    |factor| x rounding error of each case, plus the solver noise of the
+    dof. Scales with the results of each dof, so small values such as
+    rotations are checked as tightly as forces.
+
+    Parameters:
+    ------------
+    matrix: dict
+        compiled combinations, see compile_combinations
+    case_results: DataFrame
+        analysis case results indexed by (node, case) with one column per dof
+    figures: int
+        significant figures of the results, GSA exports use 4
+    noise: float
+        solver noise relative to the largest case result of each dof, e.g.
+        Ux of 1e-12 mm at a fixed bearing, which GSA exports as noise or 0
+
+    Returns:
+    ---------
+    tolerance: DataFrame
+        same index and columns as evaluate_combinations
+    '''
+    errors = pd.DataFrame(
+        rounding_error(case_results.to_numpy(), figures),
+        index=case_results.index,
+        columns=case_results.columns,
+    )
+    tolerance = evaluate_combinations(dict(matrix, data=np.abs(matrix["data"])), errors)
+    return tolerance + noise * case_results.abs().max()
+
+
+def cross_check(combined, gsa_results, tolerance, figures=4):
+    '''
+    Compare evaluated combinations with GSA's own combination results
+
+    Parameters:
+    ------------
+    combined: DataFrame
+        evaluated combinations indexed by (node, case), see evaluate_combinations
+    gsa_results: DataFrame
+        GSA results indexed by (node, case) with the same columns
+    tolerance: DataFrame
+        rounding tolerance of combined, see rounding_tolerance. The rounding
+        error of the GSA value is added to it.
+    figures: int
+        significant figures of the GSA results
+
+    Returns:
+    ---------
+    differences: DataFrame
+        rows of combined with at least one value outside the tolerance,
+        with the GSA value and the difference of each dof
+    '''
+    gsa = gsa_results.reindex(combined.index)[combined.columns]
+    available = gsa.notna().all(axis=1)
+    ours, theirs = combined.loc[available], gsa.loc[available]
+
+    allowed = tolerance.reindex(ours.index)[ours.columns].to_numpy() + rounding_error(
+        theirs.to_numpy(), figures
+    )
+    outside = np.abs(ours.to_numpy() - theirs.to_numpy()) > allowed
+    rows = outside.any(axis=1)
+
+    differences = pd.concat(
+        {"combined": ours.loc[rows], "gsa": theirs.loc[rows], "difference": (ours - theirs).loc[rows]},
+        axis=1,
+    )
+    print(
+        f"\nChecked {int(available.sum())} combination results "
+        f"({int(available.sum()) * len(ours.columns)} values) against GSA, "
+        f"{int(rows.sum())} outside tolerance"
+    )
+
+    return differences
@@ -0,0 +1,275 @@
+import pandas as pd
+import numpy as np
+
+
+"""
+Checks on extracted results, run on whole tables at once so they can stay on
+in every run.
+
+- equilibrium: the sum of the reactions of all bearings per case balances
+  the applied load, sum(F) + applied = 0
+- reaction totals: the sum of the reactions of all bearings per case
+  matches a reference snapshot of an earlier, checked run. This is a
+  regression check, not equilibrium, use it where the applied load of a
+  case is not known
+- node pairs: the reaction and displacement nodes of each bearing agree with
+  each other and with the node lists, and both have results for the same
+  cases
+
+Each check returns its violations as a DataFrame with columns =
+['check', 'node', 'case', 'dof', 'value', 'expected', 'tolerance'].
+"""
+
+
+VIOLATION_COLUMNS = ["check", "node", "case", "dof", "value", "expected", "tolerance"]
+
+def _violations(check, node, case, dof, value, expected, tolerance):
+    return pd.DataFrame(
+        {
+            "check": check,
+            "node": node,
+            "case": case,
+            "dof": dof,
+            "value": value,
+            "expected": expected,
+            "tolerance": tolerance,
+        },
+        columns=VIOLATION_COLUMNS,
+    )
+
+
+def applied_loads(cases, by_type, by_case=None):
+    '''
+    Applied loads per case from applied loads per load type and per case
+
+    Parameters:
+    ------------
+    cases: DataFrame
+        load cases indexed by load type with column 'case', see create_cases_df
+    by_type: dict
+        applied load components of every case of a load type, e.g.
+        {'T_Temp': {'Fx': 0.0, 'Fy': 0.0, 'Fz': 0.0}}
+    by_case: dict
+        applied load components of single cases, e.g. {'C11': {'Fz': -103200.0}}.
+        These take precedence over by_type.
+
+    Returns:
+    ---------
+    loads: DataFrame
+        applied loads indexed by case with one column per component, NaN
+        where the applied load is not known
+    '''
+    by_type = pd.DataFrame(by_type).T
+    loads = by_type.reindex(cases.index)
+    loads.index = pd.Index(cases["case"], name="case")
+
+    by_case = pd.DataFrame(by_case or {}).T
+    if len(by_case):
+        loads = by_case.combine_first(loads).reindex(loads.index)
+
+    return loads.astype(float)
+
+
+def _total_check(check, reactions, expected, rtol, atol):
+    '''
+    Compare the sum of the bearing reactions of each case with expected
+    totals indexed by case, NaN where there is nothing to compare
+    '''
+    dofs = [dof for dof in expected.columns if dof in reactions.columns]
+    total = reactions.groupby("case", sort=False)[dofs].sum().reindex(expected.index)
+    largest = (
+        reactions[dofs].abs().groupby(reactions["case"], sort=False).max().reindex(expected.index)
+    )
+
+    expected = expected[dofs].to_numpy(dtype=float)
+    tolerance = atol + rtol * largest.to_numpy()
+    outside = np.abs(total.to_numpy() - expected) > tolerance
+    outside &= ~np.isnan(expected)
+
+    case, dof = np.nonzero(outside)
+    return _violations(
+        check,
+        np.nan,
+        total.index.to_numpy()[case],
+        np.asarray(dofs)[dof],
+        total.to_numpy()[case, dof],
+        expected[case, dof],
+        tolerance[case, dof],
+    )
+
+
+def equilibrium_check(reactions, loads, rtol=0.005, atol=1.0):
+    '''
+    Compare the sum of the bearing reactions of each case with the applied
+    load. The reactions must include every support of the model.
+
+    Parameters:
+    ------------
+    reactions: DataFrame
+        reactions with columns = ['node', 'case'] + dofs, see get_reactions_gsa
+    loads: DataFrame
+        applied loads indexed by case, see applied_loads
+    rtol, atol: float
+        relative tolerance on the largest reaction of the case and absolute
+        tolerance
+
+    Returns:
+    ---------
+    violations: DataFrame
+    '''
+    return _total_check("equilibrium", reactions, -loads, rtol, atol)
+
+
+def reaction_total_check(reactions, reference, rtol=0.005, atol=1.0):
+    '''
+    Compare the sum of the bearing reactions of each case with the totals of
+    a reference run. A regression check: it catches load lost or moved by a
+    model or extraction change, it does not check the reference itself.
+
+    Parameters:
+    ------------
+    reactions: DataFrame
+        reactions with columns = ['node', 'case'] + dofs, see get_reactions_gsa
+    reference: dict
+        reaction totals of single cases, e.g. {'C11': {'Fz': 103200.0}}
+    rtol, atol: float
+        relative tolerance on the largest reaction of the case and absolute
+        tolerance
+
+    Returns:
+    ---------
+    violations: DataFrame
+    '''
+    reference = pd.DataFrame(reference).T.astype(float)
+    reference.index.name = "case"
+    return _total_check("reaction_total", reactions, reference, rtol, atol)
+
+
+def node_pair_check(bearings, reaction_nodes, displacement_nodes, reactions, displacements):
+    '''
+    Check the reaction and displacement node pair of each bearing:
+
+    - 'nodes' of the bearing is [reaction node, displacement node]
+    - the pair is at the same position of reaction_nodes and displacement_nodes
+    - no other bearing uses the same nodes
+    - both nodes have results for the same cases
+
+    Parameters:
+    ------------
+    bearings: dict
+        bearings with 'name', 'nodes', 'reactions' and 'displacements'
+    reaction_nodes, displacement_nodes: list
+        nodes results are extracted for, in bearing order
+    reactions, displacements: DataFrame
+        results with columns = ['node', 'case'] + dofs
+
+    Returns:
+    ---------
+    violations: DataFrame
+    '''
+    table = pd.DataFrame(bearings).T
+    pairs = pd.DataFrame(
+        table["nodes"].tolist(), index=table.index, columns=["reactions", "displacements"]
+    )
+    listed = dict(zip(reaction_nodes, displacement_nodes))
+
+    found = []
+    for key in ["reactions", "displacements"]:
+        differs = table[key] != pairs[key]
+        found.append(
+            _violations(
+                "node_pair",
+                pairs.loc[differs, key].to_numpy(),
+                np.nan,
+                table.loc[differs, "name"].to_numpy() + ": " + key,
+                table.loc[differs, key].to_numpy(),
+                pairs.loc[differs, key].to_numpy(),
+                0,
+            )
+        )
+
+        shared = table[key].duplicated(keep=False)
+        found.append(
+            _violations(
+                "node_pair",
+                table.loc[shared, key].to_numpy(),
+                np.nan,
+                table.loc[shared, "name"].to_numpy() + ": shared " + key + " node",
+                table.loc[shared, key].to_numpy(),
+                np.nan,
+                0,
+            )
+        )
+
+    paired = pairs["reactions"].map(listed)
+    unpaired = paired != pairs["displacements"]
+    found.append(
+        _violations(
+            "node_pair",
+            pairs.loc[unpaired, "reactions"].to_numpy(),
+            np.nan,
+            table.loc[unpaired, "name"].to_numpy() + ": node lists",
+            paired[unpaired].to_numpy(),
+            pairs.loc[unpaired, "displacements"].to_numpy(),
+            0,
+        )
+    )
+
+    # cases with results for one node of the pair but not the other
+    available = {}
+    for key, results in [("reactions", reactions), ("displacements", displacements)]:
+        dofs = [column for column in results.columns if column not in ["node", "case"]]
+        finite = pd.Series(
+            np.isfinite(results[dofs].to_numpy(dtype=float)).all(axis=1),
+            index=pd.MultiIndex.from_arrays([results["case"], results["node"]]),
+        )
+        available[key] = finite.groupby(level=[0, 1], sort=False).any().unstack(
+            fill_value=False
+        )
+    cases = available["reactions"].index.intersection(available["displacements"].index)
+    nodes = pairs.loc[~unpaired]
+    has_reactions = (
+        available["reactions"]
+        .reindex(index=cases, columns=nodes["reactions"], fill_value=False)
+        .to_numpy()
+    )
+    has_displacements = (
+        available["displacements"]
+        .reindex(index=cases, columns=nodes["displacements"], fill_value=False)
+        .to_numpy()
+    )
+    case, pair = np.nonzero(has_reactions != has_displacements)
+    found.append(
+        _violations(
+            "node_pair",
+            np.where(
+                has_reactions[case, pair],
+                nodes["displacements"].to_numpy()[pair],
+                nodes["reactions"].to_numpy()[pair],
+            ),
+            cases.to_numpy()[case],
+            "missing results",
+            np.nan,
+            np.nan,
+            0,
+        )
+    )
+
+    return pd.concat(found, ignore_index=True)
+
+
+def report_violations(violations, checked):
+    '''
+    Print the number of violations of each check
+
+    Parameters:
+    ------------
+    violations: DataFrame
+        violations of all checks
+    checked: dict
+        number of values checked by each check
+    '''
+    counts = violations["check"].value_counts()
+    print("\nResult checks:")
+    for check, n_checked in checked.items():
+        print(f"  {check}: {n_checked} checked, {counts.get(check, 0)} outside tolerance")
@@ -0,0 +1,115 @@
+import pandas as pd
+import numpy as np
+
+
+"""
+Assembly of long-format result tables.
+
+Results are written straight into one preallocated (nodes, cases, dofs)
+array and the final table is built once from it, in its final column
+order and index, instead of building, merging and concatenating a
+DataFrame per node.
+"""
+
+
+def allocate_results(nodes, cases, columns):
+    '''
+    Preallocate results array and the position of each case in it
+
+    Parameters:
+    ------------
+    nodes: list
+        nodes to get results for
+    cases: DataFrame
+        load cases indexed by load type with column 'case', see create_cases_df
+    columns: list
+        result columns
+
+    Returns:
+    ---------
+    values: ndarray
+        NaN array of shape (nodes, cases, columns)
+    case_position: dict
+        position of each case along the second axis of values
+    '''
+    values = np.full((len(nodes), len(cases), len(columns)), np.nan)
+    case_position = {case: i for i, case in enumerate(cases["case"])}
+    return values, case_position
+
+
+def results_table(nodes, cases, values, columns):
+    '''
+    Build long-format results table from the results array
+
+    Parameters:
+    ------------
+    nodes: list
+        nodes along the first axis of values
+    cases: DataFrame
+        load cases indexed by load type with column 'case'
+    values: ndarray
+        results of shape (nodes, cases, columns)
+    columns: list
+        result columns
+
+    Returns:
+    ---------
+    table: DataFrame
+        results indexed by load type with columns = ['node', 'case'] + columns,
+        rows ordered by node then case
+    '''
+    n_nodes, n_cases = len(nodes), len(cases)
+    values = values.reshape(n_nodes * n_cases, len(columns))
+
+    table = pd.DataFrame(
+        {
+            "node": np.repeat(np.asarray(nodes), n_cases),
+            "case": np.tile(cases["case"].to_numpy(), n_nodes),
+            **{column: values[:, j] for j, column in enumerate(columns)},
+        },
+        index=pd.Index(np.tile(cases.index.to_numpy(), n_nodes), name=cases.index.name),
+    )
+    return table
+
+
+def split_by_node(table, nodes):
+    '''
+    Split a table with rows ordered by node into a dictionary of row slices
+
+    Parameters:
+    ------------
+    table: DataFrame
+        table with the same number of rows for each node, ordered by node
+    nodes: list
+        nodes in table order
+
+    Returns:
+    ---------
+    table_by_node: dict
+        row slice of table for each node
+    '''
+    n_rows = len(table) // len(nodes)
+    return {
+        node: table.iloc[i * n_rows : (i + 1) * n_rows] for i, node in enumerate(nodes)
+    }
+
+
+def combinations_table(combinations):
+    '''
+    Arrange combinations of one factor set, as returned by
+    factor_variants.evaluate_factor_sets, in the layout of the combination
+    sheets
+
+    Parameters:
+    ------------
+    combinations: DataFrame
+        combinations indexed by (variant, node, limit_state, combination)
+        with columns = ['name'] + dofs, for a single variant
+
+    Returns:
+    ---------
+    table: DataFrame
+        combinations indexed by node with columns =
+        ['limit_state', 'combination', 'name'] + dofs
+    '''
+    return combinations.droplevel("variant").reset_index(["limit_state", "combination"])
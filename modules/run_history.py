@@ -0,0 +1,392 @@
+import hashlib
+import os
+import re
+import sqlite3
+from datetime import datetime
+import pandas as pd
+
+
+"""
+Run history store.
+
+Every run's extracted results, combinations and envelopes are stored in a
+local sqlite database in long format (one row per value), indexed by run,
+model hash, node, case and limit state, instead of a new timestamped
+workbook per run. Questions like "what was Fz at P9W in mid-February" are
+answered by query_history.
+"""
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    model_hash TEXT,
+    label TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    kind TEXT NOT NULL,
+    node INTEGER NOT NULL,
+    type TEXT,
+    "case" TEXT NOT NULL,
+    dof TEXT NOT NULL,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS combinations (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    kind TEXT NOT NULL,
+    node INTEGER NOT NULL,
+    limit_state TEXT NOT NULL,
+    combination TEXT NOT NULL,
+    name TEXT,
+    dof TEXT NOT NULL,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS envelopes (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    kind TEXT NOT NULL,
+    node INTEGER NOT NULL,
+    limit_state TEXT NOT NULL,
+    bound TEXT NOT NULL,
+    dof TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp);
+CREATE INDEX IF NOT EXISTS runs_model_hash ON runs (model_hash);
+CREATE INDEX IF NOT EXISTS results_node_case ON results (node, dof, "case", run_id);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id);
+CREATE INDEX IF NOT EXISTS combinations_node_ls
+    ON combinations (node, dof, limit_state, run_id);
+CREATE INDEX IF NOT EXISTS combinations_run ON combinations (run_id);
+CREATE INDEX IF NOT EXISTS envelopes_node_ls
+    ON envelopes (node, dof, limit_state, bound, run_id);
+CREATE INDEX IF NOT EXISTS envelopes_run ON envelopes (run_id);
+"""
+
+TABLES = ["results", "combinations", "envelopes"]
+
+# columns of each table besides run_id, kind, dof and value
+TABLE_KEYS = {
+    "results": ["node", "type", "case"],
+    "combinations": ["node", "limit_state", "combination", "name"],
+    "envelopes": ["node", "limit_state", "bound"],
+}
+
+
+def open_store(filename="output/run_history.sqlite"):
+    '''
+    Open run history database, creating tables and indexes if needed
+
+    Parameters:
+    ------------
+    filename: str
+        path to sqlite database
+
+    Returns:
+    ---------
+    connection: sqlite3.Connection
+    '''
+    connection = sqlite3.connect(filename)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def model_hash(filenames):
+    '''
+    sha256 of the model files, to tell which model version a run used.
+    None if there are no files or a file does not exist, so a run is never
+    stored with the hash of a model that was not read.
+    '''
+    filenames = list(filenames)
+    missing = [filename for filename in filenames if not os.path.exists(filename)]
+    if not filenames or missing:
+        if missing:
+            print(f"\nModel files not found, run stored without model hash: {missing}")
+        return None
+
+    sha = hashlib.sha256()
+    for filename in filenames:
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _long_rows(df, keys, dofs, run_id, kind):
+    '''
+    Melt result columns of df into (run_id, kind, *keys, dof, value) rows
+    '''
+    df = df.reset_index()
+    long = df.melt(id_vars=keys, value_vars=dofs, var_name="dof", value_name="value")
+    long["node"] = long["node"].astype(int)
+    long["value"] = pd.to_numeric(long["value"], errors="coerce")
+    long.insert(0, "kind", kind)
+    long.insert(0, "run_id", run_id)
+    long = long.astype(object).where(long.notna(), None)
+    return list(long.itertuples(index=False, name=None))
+
+
+def _insert_frames(connection, run_id, kind, frames):
+    '''
+    Insert result, combination and envelope DataFrames of one result kind
+    '''
+    for table in TABLES:
+        if table not in frames:
+            continue
+        df = frames[table].copy()
+        if table == "results":
+            df.index.name = "type"
+        if table == "envelopes":
+            df.index = df.index.set_names(["node", "limit_state", "bound"])
+
+        keys = TABLE_KEYS[table]
+        dofs = [column for column in df.columns if column not in keys]
+        rows = _long_rows(df, keys, dofs, run_id, kind)
+        columns = ", ".join(["run_id", "kind"] + [f'"{key}"' for key in keys] + ["dof", "value"])
+        placeholders = ", ".join("?" * (len(keys) + 4))
+        connection.executemany(
+            f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", rows
+        )
+
+
+def store_run(connection, bearing_results, model_files=(), label=None, timestamp=None):
+    '''
+    Store the results of one run
+
+    Parameters:
+    ------------
+    connection: sqlite3.Connection
+        run history database
+    bearing_results: dict
+        result kind and dictionary of DataFrames as written to excel, e.g.
+        {'reactions': bearing_reactions, 'displacements': bearing_displacements}
+        with keys 'results', 'combinations' and 'envelopes'
+    model_files: list
+        model files used for the run, hashed to identify the model version
+    label: str
+        optional description of the run
+    timestamp: datetime
+        time of the run, defaults to now
+
+    Returns:
+    ---------
+    run_id: int
+    '''
+    timestamp = timestamp or datetime.now()
+    with connection:
+        cursor = connection.execute(
+            "INSERT INTO runs (timestamp, model_hash, label) VALUES (?, ?, ?)",
+            (
+                timestamp.isoformat(timespec="seconds"),
+                model_hash(model_files),
+                label,
+            ),
+        )
+        run_id = cursor.lastrowid
+        for kind, frames in bearing_results.items():
+            _insert_frames(connection, run_id, kind, frames)
+
+    print(f"\nStored run {run_id} in run history")
+    return run_id
+
+
+WORKBOOK_NAME = re.compile(
+    r"bearing_(reactions|displacements|results|outputs)_"
+    r"(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}(?:-\d{2})?)\.xlsx$"
+)
+
+# columns of the legacy bearing_outputs workbooks (GSA export names) and the
+# result columns they are stored as
+OUTPUT_COLUMNS = {
+    "reactions": {"Fx": "Fx", "Fy": "Fy", "Fz": "Fz", "Mxx": "Mx", "Myy": "My", "Mzz": "Mz"},
+    "displacements": {"Ux": "Dx", "Uy": "Dy", "Uz": "Dz", "Rxx": "Rx", "Ryy": "Ry", "Rzz": "Rz"},
+}
+
+
+def _workbook_frames(filename, kind):
+    '''
+    Result, combination and envelope DataFrames of a workbook written by
+    write_to_excel. Sheets in older layouts are skipped.
+    '''
+    sheets = pd.read_excel(filename, sheet_name=None)
+
+    frames = {}
+    results = sheets.get("results", sheets.get(kind))
+    if results is not None and {"type", "node", "case"} <= set(results.columns):
+        frames["results"] = results.set_index("type")
+    combinations = sheets.get("combinations")
+    if combinations is not None and "limit_state" in combinations.columns:
+        frames["combinations"] = combinations.set_index("node")
+    envelopes = sheets.get("envelopes")
+    if envelopes is not None and "limit_state" in envelopes.columns:
+        # merged index cells are only filled on their first row
+        envelopes[["node", "limit_state"]] = envelopes[["node", "limit_state"]].ffill()
+        envelopes = envelopes.rename(columns={envelopes.columns[2]: "bound"})
+        frames["envelopes"] = envelopes.set_index(["node", "limit_state", "bound"])
+
+    return frames
+
+
+def _legacy_frames(filename, layout):
+    '''
+    Per-case results of the workbooks written before write_to_excel, in the
+    units of the current runs (displacements and rotations x 1000):
+
+    - bearing_results: sheets 'reactions' and 'displacements' with columns
+      type, node, case, Fx..Mz and Dx..Rz, displacements in m and rad
+    - bearing_outputs: sheets 'reactions' and 'displacements' with the GSA
+      export columns Node, Case, Fx..Mzz and Ux..Rzz, displacements in mm
+      and rotations in rad
+
+    Sheets of combinations only, or without nodes, are skipped.
+    '''
+    sheets = pd.read_excel(filename, sheet_name=None)
+
+    frames = {}
+    for kind in ["reactions", "displacements"]:
+        results = sheets.get(kind)
+        if results is None:
+            continue
+        if layout == "results" and {"type", "node", "case"} <= set(results.columns):
+            if kind == "displacements":
+                dofs = [column for column in results.columns if column not in ["type", "node", "case"]]
+                results[dofs] = results[dofs] * 1000
+            frames[kind] = {"results": results.set_index("type")}
+        elif layout == "outputs" and {"Node", "Case"} <= set(results.columns):
+            columns = OUTPUT_COLUMNS[kind]
+            results = results.rename(columns={"Node": "node", "Case": "case", **columns})
+            results = results[["node", "case"] + list(columns.values())]
+            if kind == "displacements":
+                results[["Rx", "Ry", "Rz"]] = results[["Rx", "Ry", "Rz"]] * 1000
+            frames[kind] = {"results": results.set_index(pd.Index([None] * len(results)))}
+
+    return frames
+
+
+def import_workbooks(connection, filenames):
+    '''
+    Backfill run history from the result workbooks of earlier runs, e.g.
+    output/old/bearing_reactions_2021-02-26_14-09.xlsx, and the per-case
+    results of the legacy bearing_results_* and bearing_outputs_* workbooks.
+    The workbooks of the same run time are stored as one run, labelled
+    'imported <run time>'. Runs that were imported before are skipped, so
+    importing again does not duplicate runs. Workbooks without results that
+    can be read are listed, not imported.
+
+    Parameters:
+    ------------
+    connection: sqlite3.Connection
+        run history database
+    filenames: list
+        paths to workbooks
+
+    Returns:
+    ---------
+    run_ids: dict
+        run time and run_id of each run, imported now or before
+    '''
+    workbooks = {}
+    for filename in filenames:
+        match = WORKBOOK_NAME.search(os.path.basename(filename))
+        if match is None:
+            print(f"\nSkipped {filename}, not a bearing results workbook")
+            continue
+        kind, stamp = match.groups()
+        workbooks.setdefault(stamp, {})[kind] = filename
+
+    run_ids = {}
+    for stamp, files in sorted(workbooks.items()):
+        label = f"imported {stamp}"
+        existing = connection.execute(
+            "SELECT run_id FROM runs WHERE label = ?", (label,)
+        ).fetchone()
+        if existing is not None:
+            run_ids[stamp] = existing[0]
+            continue
+
+        bearing_results = {}
+        for kind, filename in files.items():
+            if kind in ["results", "outputs"]:
+                frames = _legacy_frames(filename, kind)
+            else:
+                frames = {kind: _workbook_frames(filename, kind)}
+            frames = {key: value for key, value in frames.items() if value}
+            if not frames:
+                print(f"\nSkipped {filename}, no per-case results in a known layout")
+            bearing_results.update(frames)
+        if not bearing_results:
+            continue
+
+        timestamp = datetime.strptime(
+            stamp, "%Y-%m-%d_%H-%M-%S" if stamp.count("-") == 4 else "%Y-%m-%d_%H-%M"
+        )
+        run_ids[stamp] = store_run(
+            connection, bearing_results, label=label, timestamp=timestamp
+        )
+
+    return run_ids
+
+
+def query_history(
+    connection, table, node, dof, since=None, until=None, model_hash=None, **keys
+):
+    '''
+    Values of one node and dof across runs, e.g.
+
+        query_history(connection, 'envelopes', 31307, 'Fz', limit_state='ULS', bound='max')
+
+    Parameters:
+    ------------
+    connection: sqlite3.Connection
+        run history database
+    table: str
+        'results', 'combinations' or 'envelopes'
+    node: int
+        node number
+    dof: str
+        result column, e.g. 'Fz'
+    since, until: str
+        optional ISO dates limiting the run timestamps
+    model_hash: str
+        optional model hash to limit the runs to one model version
+    keys:
+        optional filters on the other table columns, e.g. case='C11',
+        limit_state='ULS', bound='max'
+
+    Returns:
+    ---------
+    history: DataFrame
+        matching values with run_id, timestamp, model_hash and label
+    '''
+    if table not in TABLES:
+        raise ValueError(f"Unknown table '{table}', use one of {TABLES}")
+    unknown = set(keys) - set(TABLE_KEYS[table])
+    if unknown:
+        raise ValueError(f"Unknown columns for {table}: {sorted(unknown)}")
+
+    conditions = ["t.node = ?", "t.dof = ?"]
+    parameters = [int(node), dof]
+    for key, value in keys.items():
+        conditions.append(f't."{key}" = ?')
+        parameters.append(value)
+    if since is not None:
+        conditions.append("r.timestamp >= ?")
+        parameters.append(since)
+    if until is not None:
+        conditions.append("r.timestamp < ?")
+        parameters.append(until)
+    if model_hash is not None:
+        conditions.append("r.model_hash = ?")
+        parameters.append(model_hash)
+
+    query = (
+        f"SELECT r.run_id, r.timestamp, r.model_hash, r.label, t.* "
+        f"FROM {table} t JOIN runs r ON r.run_id = t.run_id "
+        f"WHERE {' AND '.join(conditions)} ORDER BY r.timestamp"
+    )
+    history = pd.read_sql_query(query, connection, params=parameters)
+    history = history.loc[:, ~history.columns.duplicated()]
+    history["timestamp"] = pd.to_datetime(history["timestamp"])
+
+    return history
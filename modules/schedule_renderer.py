@@ -0,0 +1,259 @@
+import pandas as pd
+import numpy as np
+import openpyxl
+from openpyxl.utils import column_index_from_string
+
+
+"""
+Render bearing schedule sheets directly from envelopes using a declarative
+cell map, instead of copying result sheets and building lookups in excel.
+
+A cell map is a table with one row per schedule cell:
+
+    row, envelope, dof, limit_state, bound, scale, rounding, not_applicable
+
+- row: worksheet row in the schedule template
+- envelope: 'reactions' or 'displacements' for the combination envelopes,
+  'reactions_by_type' or 'displacements_by_type' for the results by load type
+- dof: result column, e.g. 'Fz', 'Dx', 'Ry'
+- limit_state: limit state label used in the factors, e.g. 'ULS', 'SLS', or
+  the load type for the results by load type, e.g. 'G_Perm'
+- bound: 'max', 'min' or 'absmax' (largest magnitude of max and min)
+- scale: optional multiplier applied to the value (defaults to 1)
+- rounding: optional step the value is rounded up to, like excel CEILING
+- not_applicable: optional bearing types, separated by ';', that do not
+  carry the dof. '-' is written for these bearings.
+
+scale and rounding are numbers or template cells, e.g. '$E$5', so the
+factors and rounding set in the template are used.
+
+Each bearing is written into its own column of the template.
+"""
+
+
+BOUNDS = ["max", "min", "absmax"]
+
+# position of the node of each envelope in the 'nodes' of a bearing
+NODE_POSITION = {
+    "reactions": 0,
+    "displacements": 1,
+    "reactions_by_type": 0,
+    "displacements_by_type": 1,
+}
+
+NOT_APPLICABLE = "-"
+
+
+def load_cell_map(filename):
+    '''
+    Read cell map from .csv file
+
+    Parameters:
+    ------------
+    filename: str
+        path to cell map .csv file
+
+    Returns:
+    ---------
+    cell_map: DataFrame
+        cell map with columns = ['row', 'envelope', 'dof', 'limit_state',
+        'bound', 'scale', 'rounding', 'not_applicable']
+    '''
+    cell_map = pd.read_csv(filename, dtype={"scale": str, "rounding": str})
+    for column, default in [("scale", "1"), ("rounding", ""), ("not_applicable", "")]:
+        if column not in cell_map.columns:
+            cell_map[column] = default
+        cell_map[column] = cell_map[column].fillna(default)
+
+    unknown = set(cell_map["bound"]) - set(BOUNDS)
+    if unknown:
+        raise ValueError(f"Unknown bound(s) in cell map: {sorted(unknown)}")
+    unknown = set(cell_map["envelope"]) - set(NODE_POSITION)
+    if unknown:
+        raise ValueError(f"Unknown envelope(s) in cell map: {sorted(unknown)}")
+
+    return cell_map
+
+
+def resolve_cell_references(cell_map, ws):
+    '''
+    Replace template cell references in the scale and rounding columns by
+    the values of the cells
+
+    Parameters:
+    ------------
+    cell_map: DataFrame
+        cell map, see load_cell_map
+    ws: Worksheet
+        schedule worksheet of the template
+
+    Returns:
+    ---------
+    cell_map: DataFrame
+        cell map with numeric scale and rounding, rounding is NaN where
+        values are not rounded
+    '''
+    cell_map = cell_map.copy()
+    for column in ["scale", "rounding"]:
+        values = []
+        for value in cell_map[column]:
+            value = str(value).strip()
+            if value == "":
+                values.append(float("nan"))
+            elif value[0] == "$" or value[0].isalpha():
+                values.append(float(ws[value.replace("$", "")].value))
+            else:
+                values.append(float(value))
+        cell_map[column] = values
+
+    return cell_map
+
+
+def envelope_lookup(envelopes):
+    '''
+    Flatten envelope DataFrames into a single Series for vectorised lookup.
+
+    Envelopes are the output of combine_reactions/combine_displacements,
+    indexed by (node, limit_state, max/min) with one column per dof.
+
+    Parameters:
+    ------------
+    envelopes: dict
+        dictionary of envelope DataFrames, e.g. {'reactions': df, 'displacements': df}
+
+    Returns:
+    ---------
+    lookup: Series
+        values indexed by (envelope, node, limit_state, bound, dof)
+    '''
+    frames = {}
+    for name, df in envelopes.items():
+        df = df.astype(float)
+        df.index = df.index.set_names(["node", "limit_state", "bound"])
+        absmax = (
+            df.abs().groupby(level=["node", "limit_state"]).max().assign(bound="absmax")
+        )
+        absmax = absmax.set_index("bound", append=True)
+        frames[name] = pd.concat([df, absmax]).stack()
+
+    lookup = pd.concat(frames)
+    lookup.index = lookup.index.set_names(
+        ["envelope", "node", "limit_state", "bound", "dof"]
+    )
+    return lookup
+
+
+def schedule_values(cell_map, envelopes, bearings, bearing_columns):
+    '''
+    Resolve every cell of the cell map for every bearing in one pass
+
+    Parameters:
+    ------------
+    cell_map: DataFrame
+        cell map with numeric scale and rounding, see resolve_cell_references
+    envelopes: dict
+        dictionary of envelope DataFrames keyed by envelope name
+    bearings: dict
+        bearing information, each bearing with 'name', 'type' and 'nodes' =
+        [reaction node, displacement node]
+    bearing_columns: dict
+        schedule column letter for each bearing name, e.g. {'p10_e_fixed': 'G'}
+
+    Returns:
+    ---------
+    values: DataFrame
+        columns = ['bearing', 'row', 'column', 'value'], one row per cell to
+        write, value is '-' where the bearing type does not carry the dof
+    '''
+    lookup = envelope_lookup(envelopes)
+
+    # cross join of bearings and cell map rows
+    bearing_table = pd.DataFrame(
+        [
+            {
+                "bearing": bearing["name"],
+                "type": bearing["type"],
+                "column": column_index_from_string(bearing_columns[bearing["name"]]),
+                **{name: bearing["nodes"][NODE_POSITION[name]] for name in envelopes.keys()},
+            }
+            for bearing in bearings.values()
+            if bearing["name"] in bearing_columns
+        ]
+    )
+    cells = bearing_table.merge(cell_map, how="cross")
+
+    # node of each cell depends on which envelope it is taken from
+    cells["node"] = 0
+    for name in envelopes.keys():
+        is_envelope = cells["envelope"] == name
+        cells.loc[is_envelope, "node"] = cells.loc[is_envelope, name]
+
+    keys = pd.MultiIndex.from_frame(
+        cells[["envelope", "node", "limit_state", "bound", "dof"]]
+    )
+    values = lookup.reindex(keys).to_numpy() * cells["scale"].to_numpy()
+
+    # round up to the rounding step, like excel CEILING
+    rounding = cells["rounding"].to_numpy(dtype=float)
+    rounded = ~np.isnan(rounding) & (rounding > 0)
+    values[rounded] = np.ceil(values[rounded] / rounding[rounded]) * rounding[rounded]
+    cells["value"] = values
+
+    not_applicable = [
+        bearing_type in types.split(";")
+        for bearing_type, types in zip(cells["type"], cells["not_applicable"])
+    ]
+    cells["value"] = cells["value"].astype(object)
+    cells.loc[not_applicable, "value"] = NOT_APPLICABLE
+
+    return cells[["bearing", "row", "column", "value"]]
+
+
+def render_schedule(
+    template, filename, cell_map, envelopes, bearings, bearing_columns, sheet_name
+):
+    '''
+    Write envelope values directly into the bearing schedule template
+
+    Cells without a matching envelope value are left untouched. Cells of
+    bearing types the cell map marks not applicable are written as '-'.
+
+    Parameters:
+    ------------
+    template: str
+        path to bearing schedule template workbook
+    filename: str
+        path of rendered workbook
+    cell_map: DataFrame
+        cell map, see load_cell_map
+    envelopes: dict
+        dictionary of envelope DataFrames keyed by envelope name
+    bearings: dict
+        bearing information
+    bearing_columns: dict
+        schedule column letter for each bearing name
+    sheet_name: str
+        name of schedule worksheet in template
+
+    Returns:
+    ---------
+    values: DataFrame
+        values written to the schedule
+    '''
+    wb = openpyxl.load_workbook(template)
+    ws = wb[sheet_name]
+
+    cell_map = resolve_cell_references(cell_map, ws)
+    values = schedule_values(cell_map, envelopes, bearings, bearing_columns)
+    values = values.dropna(subset=["value"])
+
+    for row, column, value in zip(
+        values["row"].to_numpy(), values["column"].to_numpy(), values["value"].to_numpy()
+    ):
+        if value != NOT_APPLICABLE:
+            value = float(value)
+        ws.cell(row=int(row), column=int(column), value=value)
+    wb.save(filename)
+    print(f'\nSuccessfully rendered {len(values)} schedule values to {filename}')
+
+    return values
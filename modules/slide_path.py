@@ -0,0 +1,235 @@
+import pandas as pd
+import numpy as np
+
+
+"""
+Cumulative slide path and movement ranges of bearings under traffic.
+
+The input is a movement history, e.g. a time series of the displacements of
+each step of an influence line run. Envelope load cases such as the
+NIE(Max)/NIE(Min) traffic cases are not a history and give a meaningless
+path and range count.
+
+Displacement and rotation histories are streamed through an accumulator in
+chunks, so memory does not grow with the length of the history. For each
+bearing and direction it keeps:
+
+- the cumulative path, sum of |change| between samples
+- the max and min movement
+- a histogram of half-cycle ranges between successive reversals
+  (turning points) of the movement
+
+If both Dx and Dy are streamed, the plan slide path Dxy, sum of
+sqrt(dDx^2 + dDy^2), is accumulated as well.
+"""
+
+
+DEFAULT_BINS = [0, 0.5, 1, 2, 5, 10, 20, 50, np.inf]
+
+
+class SlidePathAccumulator:
+    '''
+    Constant memory accumulator of slide path and movement ranges
+
+    Parameters:
+    ------------
+    nodes: list
+        displacement nodes of the bearings
+    dofs: list
+        directions in each chunk, e.g. ['Dx', 'Dy', 'Rz']
+    bins: list
+        edges of the half-cycle range histogram
+    '''
+
+    def __init__(self, nodes, dofs, bins=DEFAULT_BINS):
+        self.nodes = list(nodes)
+        self.dofs = list(dofs)
+        self.bins = np.asarray(bins, dtype=float)
+
+        shape = (len(self.nodes) * len(self.dofs),)
+        self.last = np.full(shape, np.nan)
+        self.turning_point = np.full(shape, np.nan)
+        self.direction = np.zeros(shape)
+        self.path = np.zeros(shape)
+        self.maximum = np.full(shape, -np.inf)
+        self.minimum = np.full(shape, np.inf)
+        self.counts = np.zeros(shape + (len(self.bins) - 1,), dtype=np.int64)
+        self.samples = 0
+
+        self.plan = "Dx" in self.dofs and "Dy" in self.dofs
+        self.plan_path = np.zeros(len(self.nodes))
+
+    def update(self, chunk):
+        '''
+        Add a chunk of the history
+
+        Parameters:
+        ------------
+        chunk: array
+            movements of shape (samples, nodes, dofs)
+        '''
+        chunk = np.asarray(chunk, dtype=float)
+        if chunk.shape[0] == 0:
+            return
+        n_samples = chunk.shape[0]
+        values = chunk.reshape(n_samples, -1)
+        channels = np.arange(values.shape[1])
+
+        # the first sample of the history is the first turning point
+        if self.samples == 0:
+            self.last = values[0].copy()
+            self.turning_point = values[0].copy()
+
+        history = np.vstack([self.last[None, :], values])
+        steps = np.diff(history, axis=0)
+
+        self.path += np.abs(steps).sum(axis=0)
+        self.maximum = np.fmax(self.maximum, values.max(axis=0))
+        self.minimum = np.fmin(self.minimum, values.min(axis=0))
+        if self.plan:
+            plan_steps = steps.reshape(n_samples, len(self.nodes), len(self.dofs))
+            dx = plan_steps[:, :, self.dofs.index("Dx")]
+            dy = plan_steps[:, :, self.dofs.index("Dy")]
+            self.plan_path += np.sqrt(dx**2 + dy**2).sum(axis=0)
+
+        # direction of each step, steps without movement keep the direction
+        signs = np.vstack([self.direction[None, :], np.sign(steps)])
+        moving = signs != 0
+        last_moving = np.maximum.accumulate(
+            np.where(moving, np.arange(n_samples + 1)[:, None], 0), axis=0
+        )
+        direction = signs[last_moving, channels]
+
+        # a reversal at history[t] when step t changes the previous direction
+        reversal = moving[1:] & (direction[:-1] != 0) & (signs[1:] != direction[:-1])
+
+        # turning points ordered by channel, then time
+        channel, step = np.nonzero(reversal.T)
+        points = history[step, channel]
+        if len(points):
+            first = np.r_[True, channel[1:] != channel[:-1]]
+            previous = np.r_[np.nan, points[:-1]]
+            previous[first] = self.turning_point[channel[first]]
+
+            ranges = np.abs(points - previous)
+            bin_index = np.clip(
+                np.digitize(ranges, self.bins) - 1, 0, len(self.bins) - 2
+            )
+            np.add.at(self.counts, (channel, bin_index), 1)
+
+            last = np.r_[channel[1:] != channel[:-1], True]
+            self.turning_point[channel[last]] = points[last]
+
+        self.direction = direction[-1]
+        self.last = history[-1]
+        self.samples += n_samples
+
+    def report(self):
+        '''
+        Slide path and movement ranges per bearing and direction. The open
+        half-cycle from the last turning point to the last sample is counted.
+
+        Returns:
+        ---------
+        summary: DataFrame
+            indexed by (node, dof) with columns = ['path', 'max', 'min',
+            'range', 'half_cycles']
+        histogram: DataFrame
+            half-cycle counts indexed by (node, dof) with one column per bin
+        '''
+        counts = self.counts.copy()
+        residual = np.abs(self.last - self.turning_point)
+        open_cycle = residual > 0
+        bin_index = np.clip(np.digitize(residual, self.bins) - 1, 0, len(self.bins) - 2)
+        np.add.at(
+            counts, (np.flatnonzero(open_cycle), bin_index[open_cycle]), 1
+        )
+
+        index = pd.MultiIndex.from_product([self.nodes, self.dofs], names=["node", "dof"])
+        summary = pd.DataFrame(
+            {
+                "path": self.path,
+                "max": self.maximum,
+                "min": self.minimum,
+                "range": self.maximum - self.minimum,
+                "half_cycles": counts.sum(axis=1),
+            },
+            index=index,
+        )
+        if self.plan:
+            plan = pd.DataFrame(
+                {"path": self.plan_path},
+                index=pd.MultiIndex.from_product(
+                    [self.nodes, ["Dxy"]], names=["node", "dof"]
+                ),
+            )
+            summary = pd.concat([summary, plan]).sort_index(level="node", sort_remaining=False)
+
+        labels = [f"{low:g}-{high:g}" for low, high in zip(self.bins[:-1], self.bins[1:])]
+        histogram = pd.DataFrame(counts, index=index, columns=labels)
+
+        return summary, histogram
+
+
+def read_time_series(filename, nodes, dofs, chunksize=100000):
+    '''
+    Stream a movement time series .csv file in chunks. The file has a
+    'time' column and one column per node and dof named '<node>_<dof>',
+    e.g. '12110_Dx'. Samples must be in time order, the file is not sorted.
+
+    Parameters:
+    ------------
+    filename: str
+        path to time series .csv file
+    nodes: list
+        displacement nodes to read
+    dofs: list
+        directions to read
+    chunksize: int
+        number of samples per chunk
+
+    Yields:
+    ---------
+    chunk: array
+        movements of shape (samples, nodes, dofs)
+    '''
+    columns = [f"{node}_{dof}" for node in nodes for dof in dofs]
+    last_time = -np.inf
+    for df in pd.read_csv(filename, usecols=["time"] + columns, chunksize=chunksize):
+        # times of the chunk, after the last time of the previous chunk
+        times = np.r_[last_time, df["time"].to_numpy(dtype=float)]
+        backwards = np.flatnonzero(np.diff(times) < 0)
+        if len(backwards):
+            i = backwards[0]
+            raise ValueError(
+                f"Time series {filename} is not in time order at row {df.index[i]}, "
+                f"time {times[i + 1]} follows {times[i]}"
+            )
+        last_time = times[-1]
+        yield df[columns].to_numpy(dtype=float).reshape(len(df), len(nodes), len(dofs))
+
+
+def accumulate_slide_path(chunks, nodes, dofs, bins=DEFAULT_BINS):
+    '''
+    Accumulate slide path and movement ranges over a stream of chunks
+
+    Parameters:
+    ------------
+    chunks: iterable
+        arrays of shape (samples, nodes, dofs)
+    nodes: list
+        displacement nodes
+    dofs: list
+        directions
+    bins: list
+        edges of the half-cycle range histogram
+
+    Returns:
+    ---------
+    summary, histogram: DataFrame
+        see SlidePathAccumulator.report
+    '''
+    accumulator = SlidePathAccumulator(nodes, dofs, bins)
+    for chunk in chunks:
+        accumulator.update(chunk)
+    return accumulator.report()
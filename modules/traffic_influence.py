@@ -0,0 +1,284 @@
+import itertools
+import pandas as pd
+import numpy as np
+
+
+"""
+Traffic envelopes from unit-load influence surfaces.
+
+The influence surface of each bearing result is given on a regular grid of
+deck positions, x along the deck and y across it, as the result at the
+bearing due to a unit load at (x, y). LM1 (EN 1991-2 4.3.2) is placed on the
+surface for many lane layouts at once:
+
+- tandem system: two axles 1.2 m apart, wheels 2.0 m apart, moved along x
+  and across the lane in steps with its wheels inside the lane, only
+  included where it is adverse
+- UDL: applied to the adverse parts of each lane and of the remaining area
+
+A lane layout is the left edge (y) of each notional lane, in lane number
+order, so the first entry is lane 1.
+"""
+
+
+# EN 1991-2 Table 4.2: tandem axle load [kN] and UDL [kN/m2] per lane
+LM1_AXLE_LOADS = [300.0, 200.0, 100.0]
+LM1_UDL = [9.0, 2.5, 2.5]
+LM1_UDL_REMAINING = 2.5
+
+LANE_WIDTH = 3.0
+AXLE_SPACING = 1.2
+WHEEL_SPACING = 2.0
+WHEEL_WIDTH = 0.4
+
+# largest transverse offset of the tandem from the lane centre with the
+# wheels inside the lane, EN 1991-2 Figure 4.2b
+TANDEM_OFFSET = (LANE_WIDTH - WHEEL_SPACING - WHEEL_WIDTH) / 2
+
+
+def read_influence_surfaces(filename):
+    '''
+    Read unit-load influence surfaces from .csv file in long format with
+    columns = ['node', 'dof', 'x', 'y', 'value']
+
+    Parameters:
+    ------------
+    filename: str
+        path to influence surface .csv file
+
+    Returns:
+    ---------
+    surfaces: dict
+        'nodes', 'dofs', 'x', 'y' and 'values', with values an array of
+        shape (nodes, dofs, x, y)
+    '''
+    df = pd.read_csv(filename)
+    nodes = np.sort(df["node"].unique())
+    dofs = list(pd.unique(df["dof"]))
+    xs = np.sort(df["x"].unique())
+    ys = np.sort(df["y"].unique())
+
+    values = np.zeros((len(nodes), len(dofs), len(xs), len(ys)))
+    values[
+        np.searchsorted(nodes, df["node"]),
+        pd.Index(dofs).get_indexer(df["dof"]),
+        np.searchsorted(xs, df["x"]),
+        np.searchsorted(ys, df["y"]),
+    ] = df["value"].to_numpy()
+
+    return {"nodes": nodes, "dofs": dofs, "x": xs, "y": ys, "values": values}
+
+
+def lane_layouts(carriageway, n_lanes, step=0.5):
+    '''
+    Generate lane layouts: a band of adjacent notional lanes shifted across
+    the carriageway in steps, with every numbering of the lanes in the band
+
+    Parameters:
+    ------------
+    carriageway: tuple
+        (y_min, y_max) of the carriageway
+    n_lanes: int
+        number of notional lanes
+    step: float
+        transverse step of the lane band [m]
+
+    Returns:
+    ---------
+    layouts: array
+        left edge of each lane in lane number order, shape (layouts, n_lanes)
+    '''
+    y_min, y_max = carriageway
+    band_width = n_lanes * LANE_WIDTH
+    if band_width > y_max - y_min:
+        raise ValueError(f"{n_lanes} lanes do not fit on the carriageway")
+
+    shifts = np.arange(y_min, y_max - band_width + 1e-9, step)
+    band = np.arange(n_lanes) * LANE_WIDTH
+    orders = np.array(list(itertools.permutations(range(n_lanes))))
+
+    return (shifts[:, None, None] + band[orders][None, :, :]).reshape(-1, n_lanes)
+
+
+def _cell_widths(coords):
+    '''
+    Tributary width of each grid coordinate
+    '''
+    edges = np.concatenate(
+        [[coords[0]], (coords[1:] + coords[:-1]) / 2, [coords[-1]]]
+    )
+    return np.diff(edges), edges
+
+
+def _strip_weights(ys, y_from, y_to):
+    '''
+    Overlap of each y cell with the strips [y_from, y_to], shape (strips, y)
+    '''
+    _, edges = _cell_widths(ys)
+    lower = np.maximum(edges[:-1][None, :], np.asarray(y_from)[:, None])
+    upper = np.minimum(edges[1:][None, :], np.asarray(y_to)[:, None])
+    return np.clip(upper - lower, 0, None)
+
+
+def _interpolate(values, xs, ys, x, y):
+    '''
+    Bilinear interpolation of the surfaces at points (x, y). Points off the
+    grid are off the deck and give zero.
+    '''
+    ix = np.clip(np.searchsorted(xs, x) - 1, 0, len(xs) - 2)
+    iy = np.clip(np.searchsorted(ys, y) - 1, 0, len(ys) - 2)
+    tx = (x - xs[ix]) / (xs[ix + 1] - xs[ix])
+    ty = (y - ys[iy]) / (ys[iy + 1] - ys[iy])
+    on_deck = (x >= xs[0]) & (x <= xs[-1]) & (y >= ys[0]) & (y <= ys[-1])
+
+    result = (
+        values[..., ix, iy] * (1 - tx) * (1 - ty)
+        + values[..., ix + 1, iy] * tx * (1 - ty)
+        + values[..., ix, iy + 1] * (1 - tx) * ty
+        + values[..., ix + 1, iy + 1] * tx * ty
+    )
+    return np.where(on_deck, result, 0.0)
+
+
+def traffic_envelopes(
+    surfaces, layouts, carriageway, alpha_Q=None, alpha_q=None, tandem_step=0.1
+):
+    '''
+    Max and min LM1 bearing effects for every lane layout
+
+    Lane effects only depend on the lane position and lane number, so the
+    tandem traces and UDL integrals are computed once per unique lane edge
+    and gathered for all layouts.
+
+    Parameters:
+    ------------
+    surfaces: dict
+        influence surfaces, see read_influence_surfaces
+    layouts: array
+        left edge of each lane in lane number order, shape (layouts, lanes)
+    carriageway: tuple
+        (y_min, y_max) of the carriageway, the remaining area is the
+        carriageway outside the lanes
+    alpha_Q: list
+        adjustment factors of the tandem axle loads per lane, default 1
+    alpha_q: list
+        adjustment factors of the UDL per lane and remaining area, default 1
+    tandem_step: float
+        transverse step of the tandem within the lane [m], the lane centre
+        and both extreme offsets are always included
+
+    Returns:
+    ---------
+    envelopes: DataFrame
+        effects indexed by (layout, node, max/min) with one column per dof
+    '''
+    values, xs, ys = surfaces["values"], surfaces["x"], surfaces["y"]
+    layouts = np.atleast_2d(np.asarray(layouts, dtype=float))
+    n_layouts, n_lanes = layouts.shape
+
+    # characteristic loads for each lane number and the remaining area
+    axle_loads = np.zeros(n_lanes)
+    udl = np.full(n_lanes + 1, LM1_UDL_REMAINING)
+    n_loaded = min(n_lanes, len(LM1_AXLE_LOADS))
+    axle_loads[:n_loaded] = LM1_AXLE_LOADS[:n_loaded]
+    udl[:n_loaded] = LM1_UDL[:n_loaded]
+    if alpha_Q is not None:
+        axle_loads *= np.asarray(alpha_Q)[:n_lanes]
+    if alpha_q is not None:
+        udl *= np.asarray(alpha_q)[: n_lanes + 1]
+
+    edges, edge_idx = np.unique(layouts, return_inverse=True)
+    edge_idx = edge_idx.reshape(n_layouts, n_lanes)
+
+    # transverse positions of the tandem centre in the lane
+    n_offsets = int(np.ceil(2 * TANDEM_OFFSET / tandem_step - 1e-9)) + 1
+    offsets = np.unique(
+        np.r_[np.linspace(-TANDEM_OFFSET, TANDEM_OFFSET, n_offsets), 0.0]
+    )
+
+    # tandem trace for a unit axle load: 4 wheels of 1/2 for each lane edge,
+    # transverse offset and axle position, shape (nodes, dofs, edges, offsets, x)
+    centre = edges[:, None] + LANE_WIDTH / 2 + offsets[None, :]
+    wheel_x = np.stack([xs, xs, xs + AXLE_SPACING, xs + AXLE_SPACING], axis=-1)
+    wheel_y = np.array([-1, 1, -1, 1]) * WHEEL_SPACING / 2
+    x = np.broadcast_to(wheel_x, (len(edges), len(offsets), len(xs), 4))
+    y = centre[:, :, None, None] + wheel_y
+    tandem = _interpolate(values, xs, ys, x, y).sum(axis=-1) / 2
+    tandem_max = np.clip(tandem.max(axis=(-2, -1)), 0, None)
+    tandem_min = np.clip(tandem.min(axis=(-2, -1)), None, 0)
+
+    # adverse parts of the surface integrated along x, shape (nodes, dofs, y)
+    x_widths, _ = _cell_widths(xs)
+    positive = np.einsum("ndxy,x->ndy", np.clip(values, 0, None), x_widths)
+    negative = np.einsum("ndxy,x->ndy", np.clip(values, None, 0), x_widths)
+
+    # unit UDL on each lane, shape (nodes, dofs, edges)
+    lane_weights = _strip_weights(ys, edges, edges + LANE_WIDTH)
+    udl_max = positive @ lane_weights.T
+    udl_min = negative @ lane_weights.T
+
+    # unit UDL on the remaining area of each layout, shape (nodes, dofs, layouts)
+    carriageway_weights = _strip_weights(ys, [carriageway[0]], [carriageway[1]])[0]
+    lane_cover = lane_weights[edge_idx].sum(axis=1)
+    remaining_weights = np.clip(carriageway_weights[None, :] - lane_cover, 0, None)
+    remaining_max = positive @ remaining_weights.T
+    remaining_min = negative @ remaining_weights.T
+
+    # gather lane effects for every layout and add the lanes together
+    lane_max = (
+        tandem_max[..., edge_idx] * axle_loads + udl_max[..., edge_idx] * udl[:-1]
+    ).sum(axis=-1) + remaining_max * udl[-1]
+    lane_min = (
+        tandem_min[..., edge_idx] * axle_loads + udl_min[..., edge_idx] * udl[:-1]
+    ).sum(axis=-1) + remaining_min * udl[-1]
+
+    # (nodes, dofs, layouts) -> rows ordered by layout, node, max/min
+    results = np.stack([lane_max, lane_min], axis=-1).transpose(2, 0, 3, 1)
+    index = pd.MultiIndex.from_product(
+        [np.arange(n_layouts), surfaces["nodes"], ["max", "min"]],
+        names=["layout", "node", "bound"],
+    )
+
+    return pd.DataFrame(
+        results.reshape(-1, len(surfaces["dofs"])),
+        index=index,
+        columns=surfaces["dofs"],
+    )
+
+
+def governing_envelope(envelopes):
+    '''
+    Envelope of all lane layouts and the layout that governs each value
+
+    Parameters:
+    ------------
+    envelopes: DataFrame
+        effects indexed by (layout, node, max/min), see traffic_envelopes
+
+    Returns:
+    ---------
+    envelope: DataFrame
+        effects indexed by (node, max/min)
+    governing_layout: DataFrame
+        layout id of each value in envelope
+    '''
+    maxima = envelopes.xs("max", level="bound")
+    minima = envelopes.xs("min", level="bound")
+
+    envelope = pd.concat(
+        {
+            "max": maxima.groupby(level="node").max(),
+            "min": minima.groupby(level="node").min(),
+        },
+        names=["bound"],
+    ).swaplevel().sort_index()
+
+    governing_layout = pd.concat(
+        {
+            "max": maxima.groupby(level="node").idxmax().apply(lambda column: column.str[0]),
+            "min": minima.groupby(level="node").idxmin().apply(lambda column: column.str[0]),
+        },
+        names=["bound"],
+    ).swaplevel().sort_index()
+
+    return envelope, governing_layout